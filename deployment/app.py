@@ -25,6 +25,7 @@ def main():
         f"{config.app_name}S3CloudFrontStack", 
         app_name=config.app_name,
         cloudfront_url_param = config.cloudfront_url_param,
+        image_variants = config.product_image_variants,
         env=env,
         description='Guidance for Generative AI Shopping Assistant using Agents for Amazon Bedrock (SO9539)'
     )
@@ -0,0 +1,132 @@
+import json
+import logging
+
+logger = logging.getLogger()
+
+class ValidationError(Exception):
+    pass
+
+def resolve(schema, components):
+    """Follow a #/components/schemas/<name> reference."""
+    while "$ref" in schema:
+        schema = components[schema["$ref"].rsplit('/', 1)[-1]]
+    return schema
+
+def coerce(name, value, schema):
+    """Convert a parameter value, always passed as a string by the agent, to the type in its schema."""
+    value_type = schema.get("type", "string")
+    try:
+        if value_type == "integer":
+            return int(value)
+        if value_type == "number":
+            return float(value)
+        if value_type == "boolean":
+            if isinstance(value, bool):
+                return value
+            if str(value).lower() not in ("true", "false"):
+                raise ValueError(value)
+            return str(value).lower() == "true"
+        if value_type in ("array", "object"):
+            parsed = json.loads(value) if isinstance(value, str) else value
+            if not isinstance(parsed, list if value_type == "array" else dict):
+                raise ValueError(value)
+            return parsed
+    except (ValueError, TypeError):
+        raise ValidationError(f"{name} must be of type {value_type}")
+    return value
+
+def check_array_items(name, items, schema, components):
+    """Check the required fields and field types of an array of objects."""
+    item_schema = resolve(schema.get("items", {}), components)
+    properties = item_schema.get("properties", {})
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValidationError(f"{name}[{index}] must be an object")
+        for field in item_schema.get("required", []):
+            if item.get(field) in (None, ""):
+                raise ValidationError(f"{name}[{index}] is missing {field}")
+        for field, field_schema in properties.items():
+            if field in item and field_schema.get("type") in ("integer", "number") and (
+                    isinstance(item[field], bool) or not isinstance(item[field], (int, float))):
+                raise ValidationError(f"{name}[{index}].{field} must be of type {field_schema['type']}")
+
+class Operation:
+    """One API operation of the action group schema, with its path, query and request body parameters."""
+
+    def __init__(self, operation_id, parameters, body_properties, required, components):
+        self.operation_id = operation_id
+        self.parameters = parameters
+        self.body_properties = body_properties
+        self.required = required
+        self.components = components
+        self.function = None
+
+    def parse(self, event):
+        """Build the validated parameter dict from the event in one pass over its parameters and properties."""
+        values = {}
+        for item in event.get('parameters') or []:
+            if item['name'] in self.parameters:
+                values[item['name']] = item['value']
+        body = (event.get('requestBody') or {}).get('content', {}).get('application/json', {})
+        for item in body.get('properties') or []:
+            if item['name'] in self.body_properties:
+                values[item['name']] = item['value']
+
+        missing = [name for name in self.required if values.get(name) in (None, "")]
+        if missing:
+            raise ValidationError(f"Missing required parameters: {', '.join(missing)}")
+
+        params = {}
+        for name, value in values.items():
+            schema = self.parameters.get(name) or self.body_properties[name]
+            params[name] = coerce(name, value, schema)
+            if schema.get("type") == "array":
+                check_array_items(name, params[name], schema, self.components)
+        return params
+
+class ActionRegistry:
+    """Action group operations keyed on (apiPath, httpMethod), built from the OpenAPI schema.
+
+    Functions are bound to operations by operationId with the action decorator, and are called
+    with the parsed parameters and the event.
+    """
+
+    def __init__(self, schema):
+        components = schema.get("components", {}).get("schemas", {})
+        self.operations = {}
+        for api_path, methods in schema["paths"].items():
+            for http_method, spec in methods.items():
+                parameters = {item["name"]: item.get("schema", {}) for item in spec.get("parameters", [])}
+                required = [item["name"] for item in spec.get("parameters", []) if item.get("required")]
+                body_schema = resolve(
+                    spec.get("requestBody", {}).get("content", {}).get("application/json", {}).get("schema", {}), components)
+                body_properties = {name: resolve(prop, components) for name, prop in body_schema.get("properties", {}).items()}
+                required += body_schema.get("required", [])
+                self.operations[(api_path, http_method.upper())] = Operation(
+                    spec["operationId"], parameters, body_properties, required, components)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def action(self, operation_id):
+        def register(function):
+            operation = next((op for op in self.operations.values() if op.operation_id == operation_id), None)
+            if operation is None:
+                raise ValueError(f"Operation {operation_id} is not in the action group schema")
+            operation.function = function
+            return function
+        return register
+
+    def dispatch(self, event):
+        """Return (status code, body) for the event's action."""
+        operation = self.operations.get((event['apiPath'], event['httpMethod'].upper()))
+        if operation is None or operation.function is None:
+            return 404, {"error": "{}::{} is not a valid api, try another one.".format(event['actionGroup'], event['apiPath'])}
+        try:
+            params = operation.parse(event)
+        except ValidationError as e:
+            logger.info(f"Invalid {operation.operation_id} request: {e}")
+            return 400, {"error": str(e)}
+        return 200, operation.function(params, event)
@@ -0,0 +1,47 @@
+import os
+import json
+import logging
+
+logger = logging.getLogger()
+
+class CatalogIndex:
+    """Product names and prices by product ID, used to price orders instead of trusting agent supplied prices."""
+
+    def __init__(self, products):
+        self.products = {product['id']: {'name': product['name'], 'price': product['price']} for product in products}
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            index = cls(json.load(f))
+        logger.info(f"Loaded catalog index with {len(index.products)} products from {path}")
+        return index
+
+    def price_items(self, order_items):
+        """Return (priced_items, unknown_product_ids).
+
+        Each item takes its name and unit price from the catalog, and lineTotal is its price times quantity.
+        """
+        priced_items = []
+        unknown = []
+        for item in order_items:
+            product = self.products.get(str(item['productId']))
+            if product is None:
+                unknown.append(item['productId'])
+                continue
+            priced_items.append({
+                'productId': str(item['productId']),
+                'productName': product['name'],
+                'quantity': item['quantity'],
+                'price': product['price'],
+                'lineTotal': round(product['price'] * item['quantity'], 2)
+            })
+        return priced_items, unknown
+
+def get_catalog_index():
+    """The price index written next to this file at deployment, or the catalog snapshot for local runs."""
+    paths = (
+        os.path.join(os.path.dirname(__file__), "catalog_prices.json"),
+        os.environ.get('CATALOG_FILE') or os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", "..", "data", "products.json")
+    )
+    return CatalogIndex.from_file(next(path for path in paths if os.path.exists(path)))
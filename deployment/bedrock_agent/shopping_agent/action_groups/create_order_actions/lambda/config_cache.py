@@ -0,0 +1,47 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger()
+
+class ConfigCache:
+    """Lazily resolved configuration values, cached per container with a TTL.
+
+    Each value is loaded on first use. Once its TTL has passed the cached value keeps being
+    returned while a single background thread loads a fresh one, so only the first call in
+    a container waits for the lookup. Empty values, such as a failed lookup, are retried on
+    the next call instead of being cached.
+    """
+
+    def __init__(self, loaders, ttl_seconds=300):
+        self.loaders = loaders
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.values = {}
+        self.refreshing = set()
+
+    def load(self, name):
+        value = self.loaders[name]()
+        if value:
+            with self.lock:
+                self.values[name] = (value, time.monotonic() + self.ttl_seconds)
+        return value
+
+    def refresh(self, name):
+        try:
+            self.load(name)
+        except Exception as e:
+            logger.error(f"Failed to refresh config value {name}: {e}")
+        finally:
+            with self.lock:
+                self.refreshing.discard(name)
+
+    def get(self, name):
+        with self.lock:
+            cached = self.values.get(name)
+            if cached is not None and time.monotonic() >= cached[1] and name not in self.refreshing:
+                self.refreshing.add(name)
+                threading.Thread(target=self.refresh, args=(name,), daemon=True).start()
+        if cached is not None:
+            return cached[0]
+        return self.load(name)
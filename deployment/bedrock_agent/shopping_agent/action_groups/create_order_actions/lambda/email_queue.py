@@ -0,0 +1,48 @@
+import os
+import json
+import uuid
+import logging
+import threading
+import boto3
+
+logger = logging.getLogger()
+
+class SqsEmailQueue:
+    """Order confirmation emails queued to SQS, sent by the order email consumer Lambda."""
+
+    def __init__(self, queue_url, sqs=None):
+        self.queue_url = queue_url
+        self.sqs = sqs or boto3.client('sqs')
+
+    def send(self, message):
+        response = self.sqs.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(message, separators=(',', ':')))
+        return response['MessageId']
+
+class LocalEmailQueue:
+    """In-process stand-in for SqsEmailQueue. Queued messages can be handed to the consumer as an SQS event."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.messages = []
+
+    def send(self, message):
+        message_id = str(uuid.uuid4())
+        with self.lock:
+            self.messages.append((message_id, json.dumps(message, separators=(',', ':'))))
+        return message_id
+
+    def to_sqs_event(self, batch_size=10):
+        """Remove up to batch_size messages and return them in the shape of an SQS event."""
+        with self.lock:
+            batch, self.messages = self.messages[:batch_size], self.messages[batch_size:]
+        return {"Records": [
+            {"messageId": message_id, "body": body, "eventSource": "aws:sqs"} for message_id, body in batch
+        ]}
+
+def get_email_queue():
+    """SQS when EMAIL_QUEUE_URL is set, otherwise a local in-memory queue."""
+    queue_url = os.environ.get('EMAIL_QUEUE_URL')
+    if queue_url:
+        return SqsEmailQueue(queue_url)
+    logger.warning("EMAIL_QUEUE_URL is not set. Order emails are queued in memory only.")
+    return LocalEmailQueue()
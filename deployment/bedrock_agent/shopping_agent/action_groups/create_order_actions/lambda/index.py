@@ -1,8 +1,14 @@
 import json
 import urllib.request
 import os
-import uuid
 import logging
+import urllib3
+from datetime import datetime, timezone
+from config_cache import ConfigCache
+from action_registry import ActionRegistry
+from email_queue import get_email_queue
+from catalog_index import get_catalog_index
+from order_repository import get_order_repository, get_idempotency_token, get_order_id
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -56,110 +62,165 @@ def get_secret(secret_name):
         logger.error(f"An unexpected error occurred: {e}")
         return ""
 
+# Product service API URL and key, from environment variables when set, otherwise from SSM Parameter Store
+# and Secrets Manager. They are looked up once per container and refreshed in the background after the TTL.
+config = ConfigCache({
+    "api_url": lambda: os.environ.get('API_URL') or get_ssm_parameter(os.environ.get('API_URL_PARAM')),
+    "api_key": lambda: os.environ.get('API_KEY') or get_secret(os.environ.get('API_KEY_SECRET_NAME'))
+}, ttl_seconds=int(os.environ.get('CONFIG_CACHE_TTL', '300')))
+
+# Keep-alive connections to the product API, reused across invocations of the same container.
+# Only connection errors are retried, since a read timeout may mean the request was processed
+http = urllib3.PoolManager(
+    maxsize=4,
+    timeout=urllib3.Timeout(connect=2.0, read=float(os.environ.get('PRODUCT_API_READ_TIMEOUT', '10'))),
+    retries=urllib3.Retry(total=2, connect=2, read=0, status=0, backoff_factor=0.2)
+)
+
+# Reservation requests are idempotent on the reservation ID, so they are also retried after read timeouts
+# and server errors. The last response is returned for invoke_url to check
+reservation_retries = urllib3.Retry(total=3, connect=2, read=2, status=2, status_forcelist=(500, 502, 503, 504),
+                                    allowed_methods=None, backoff_factor=0.5, raise_on_status=False)
+
+# DynamoDB when ORDERS_TABLE_NAME is set, otherwise an in-memory store for local runs
+order_repository = get_order_repository()
+
+# Confirmation emails are queued and sent by a separate consumer, so the agent's turn never waits on the email provider
+email_queue = get_email_queue()
+
+# Names and prices of every product, loaded once per container. Orders are priced from it
+catalog_index = get_catalog_index()
+
+# Operations keyed on (apiPath, httpMethod) from the action group schema, which is copied next to this
+# file at deployment. Local runs read it from the api_schema folder
+schema_file = "create_order_actions.openapi.json"
+schema_path = next(path for path in (
+    os.path.join(os.path.dirname(__file__), schema_file),
+    os.path.join(os.path.dirname(__file__), "..", "api_schema", schema_file)
+) if os.path.exists(path))
+actions = ActionRegistry.from_file(schema_path)
+
 def handler(event, context):
     logging.info(event)
-    action = event['actionGroup']
-    api_path = event['apiPath']
-    http_method = event['httpMethod']
-    
-    # Get API Gateway params from environment variable or SSM Parameter Store
-    apigateway_url =  os.environ.get('API_URL', get_ssm_parameter(os.environ.get('API_URL_PARAM')))
-    api_key =  os.environ.get('API_URL', get_secret(os.environ.get('API_KEY_SECRET_NAME')))
-
-    if api_path == "/orders" and http_method == "POST":
-        body = create_order(event)
-    elif api_path == "/products/{productId}/inventory" and http_method == "GET":
-        body = get_product_inventory(event, apigateway_url, api_key)
-    elif api_path == "/orders/{orderId}/sendEmail" and http_method == "POST":
-        body = send_order_confirmation_email(event)
-    else:
-        body = {"{}::{} is not a valid api, try another one.".format(action, api_path)}
+    status_code, body = actions.dispatch(event)
 
+    # Compact JSON keeps the action result small in the agent's context
     response_body = {
         'application/json': {
-            'body': str(body)
+            'body': json.dumps(body, separators=(',', ':'), default=str)
         }
     }
     action_response = {
         'actionGroup': event['actionGroup'],
         'apiPath': event['apiPath'],
         'httpMethod': event['httpMethod'],
-        'httpStatusCode': 200,
+        'httpStatusCode': status_code,
         'responseBody': response_body
     }
 
     response = {'response': action_response}
     return response
 
-def get_named_parameter(event, name):
-    return next(item for item in event['parameters'] if item['name'] == name)['value']
-
-def get_named_property(event, name):
-    return next(
-        item for item in
-        event['requestBody']['content']['application/json']['properties']
-        if item['name'] == name)['value']
-
-def invoke_url(url, path, api_key, method='GET', data=None):
-    url = url + path
+def invoke_url(url, path, api_key, method='GET', data=None, ok_statuses=(200,), retries=None):
     headers = {
     'Content-Type': 'application/json',
     'x-api-key': api_key
     }
 
-    req = urllib.request.Request(url, headers=headers, method=method, data=data)
-    with urllib.request.urlopen(req) as response:
-        return json.loads(response.read())
-
-def get_product_inventory(event, apigateway_url, api_key):
-    return invoke_url(apigateway_url, 'products/id/' + get_named_parameter(event, 'productId'), api_key)
-
-def create_order(event):
-    email = get_named_property(event,"email")
-    order_items_str = get_named_property(event,"orderItems")
-    first_name = get_named_property(event,"firstName")
-    last_name = get_named_property(event,"lastName")
-    address = get_named_property(event,"address")
-    city =get_named_property(event,"city")
-    zip_code = get_named_property(event,"zipCode")
-    state = get_named_property(event,"state")
-    country = get_named_property(event,"country")
-    
-    try:
-        order_items = json.loads(order_items_str)
-    except (json.JSONDecodeError, KeyError, TypeError):
-        # Handle the case where order_details is not a valid JSON string or doesn't have the expected structure
-        return {"error": "Invalid order details format"}
-
-    # Generate a random GUID as a prefix for the order ID
-    order_id_prefix = str(uuid.uuid4())
+    response = http.request(method, url + path, headers=headers, body=data, retries=retries)
+    if response.status not in ok_statuses:
+        raise RuntimeError(f"Product API {method} {path} returned {response.status}: {response.data[:200]}")
+    return json.loads(response.data)
+
+def trim_availability(item):
+    """Only the availability fields the agent reasons about."""
+    return {key: item[key] for key in ("productId", "requestedQuantity", "currentStock", "available") if key in item}
+
+@actions.action("getProductInventory")
+def get_product_inventory(params, event):
+    product = invoke_url(config.get('api_url'), 'products/id/' + params['productId'], config.get('api_key'), ok_statuses=(200, 404))
+    if "id" not in product:
+        return {"error": "Product not found"}
+    return {
+        "productId": product["id"],
+        "name": product["name"],
+        "price": product["price"],
+        "currentStock": product["current_stock"],
+        "available": product["current_stock"] > 0
+    }
 
-    # Implement order creation logic here
-    order_id = f"{order_id_prefix}-ORDER"
-    total_amount = sum(item["price"] * item["quantity"] for item in order_items)
+@actions.action("checkInventoryBatch")
+def check_inventory_batch(params, event):
+    # Only the product ID and quantity are needed, whatever else the agent passes for each item
+    items = [{"productId": item["productId"], "quantity": item["quantity"]} for item in params["items"]]
+    data = json.dumps({"items": items}).encode('utf-8')
+    result = invoke_url(config.get('api_url'), 'products/inventory:batch', config.get('api_key'), method='POST', data=data)
+    return {"items": [trim_availability(item) for item in result["items"]], "allAvailable": result["allAvailable"]}
+
+def reserve_inventory(apigateway_url, api_key, reservation_id, order_items):
+    """Reserve stock for every order item. Returns the reservation, with reserved False if any item is out of stock."""
+    items = [{"productId": item["productId"], "quantity": item["quantity"]} for item in order_items]
+    data = json.dumps({"reservationId": reservation_id, "items": items}).encode('utf-8')
+    # 409 means some items are out of stock, with their availability in the body
+    return invoke_url(apigateway_url, 'inventory/reservations', api_key, method='POST', data=data, ok_statuses=(200, 409),
+                      retries=reservation_retries)
+
+@actions.action("createOrder")
+def create_order(params, event):
+    apigateway_url = config.get('api_url')
+    api_key = config.get('api_key')
+    # Items are priced from the catalog, whatever prices the agent passed. Stock is checked
+    # by the reservation below, so the agent does not need to look items up before checkout
+    order_items, unknown = catalog_index.price_items(params["orderItems"])
+    if unknown:
+        return {"error": "Some products are not in the catalog", "unknownProductIds": unknown}
+
+    # The order ID is derived from the agent session and the cart, so a retried request
+    # returns the order it already created instead of placing a duplicate one
+    idempotency_token = get_idempotency_token(event['sessionId'], order_items)
+    order_id = get_order_id(idempotency_token)
+    total_amount = round(sum(item["lineTotal"] for item in order_items), 2)
 
     order_response = {
         "id": order_id,
-        "email": email,
+        "email": params["email"],
         "order": {
             "orderItems": order_items,
             "shippingAddress": {
-                "firstName": first_name,
-                "lastName": last_name,
-                "address": address,
-                "city": city,
-                "zipCode": zip_code,
-                "state": state,
-                "country": country
+                "firstName": params["firstName"],
+                "lastName": params["lastName"],
+                "address": params["address"],
+                "city": params["city"],
+                "zipCode": params["zipCode"],
+                "state": params["state"],
+                "country": params["country"]
             }
         },
-        "totalAmount": total_amount
+        "totalAmount": total_amount,
+        "createdAt": datetime.now(timezone.utc).isoformat()
     }
 
-    response = {
-        "orderId": order_id,
-        "orderDetails": order_response
-    }
+    # Stock is reserved under the order ID, so a retried request finds its existing reservation.
+    # The reservation is committed before the order is stored, so a stored order never holds
+    # stock that can expire. If storing the order fails, the reservation is released again
+    reservation = reserve_inventory(apigateway_url, api_key, order_id, order_items)
+    if not reservation["reserved"]:
+        unavailable = [trim_availability(item) for item in reservation["items"] if not item["available"]]
+        return {"error": "Some items are not available in the requested quantity", "unavailableItems": unavailable}
+
+    invoke_url(apigateway_url, f'inventory/reservations/{order_id}/commit', api_key, method='POST', retries=reservation_retries)
+    try:
+        order_response, created = order_repository.create_order(order_response)
+    except Exception:
+        # The order may have been written before the error, in which case it keeps its stock
+        stored_order = order_repository.get_order(order_id)
+        if stored_order is None:
+            invoke_url(apigateway_url, f'inventory/reservations/{order_id}', api_key, method='DELETE', retries=reservation_retries)
+            raise
+        logger.warning(f"Order {order_id} was stored despite an error writing it")
+        order_response, created = stored_order, False
+    if not created:
+        logger.info(f"Order {order_id} was already placed in session {event['sessionId']}")
 
     response = {
         "orderId": order_id,
@@ -168,14 +229,22 @@ def create_order(event):
 
     return response
 
-def send_order_confirmation_email(event):
-    email = get_named_property(event,"email")
-    email_body = get_named_property(event,"emailBody")
-    order_id = get_named_parameter(event,"orderId")
+@actions.action("sendOrderConfirmationEmail")
+def send_order_confirmation_email(params, event):
+    order_id = params["orderId"]
+    order = order_repository.get_order(order_id)
+    if order is None:
+        return {"error": f"Order {order_id} not found"}
 
-    # Validate required fields
-    if not all([email, email_body, order_id]):
-        raise ValueError("Missing required fields in the request body")
+    # The email only ever goes to the address the order was placed with, never to one supplied later in the conversation
+    if params["email"].strip().lower() != order["email"].strip().lower():
+        logger.warning(f"Refused confirmation email for order {order_id} to an address other than the order's")
+        return {"error": f"The email address does not match the address of order {order_id}"}
 
-   
-    return f"Email sent successfully to {email}"
+    message_id = email_queue.send({
+        "orderId": order_id,
+        "email": order["email"],
+        "emailBody": params["emailBody"]
+    })
+    logger.info(f"Queued confirmation email for order {order_id} as message {message_id}")
+    return f"Order confirmation email to {order['email']} is queued for delivery"
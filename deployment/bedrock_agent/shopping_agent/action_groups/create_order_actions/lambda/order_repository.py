@@ -0,0 +1,142 @@
+import os
+import json
+import boto3
+import uuid
+import hashlib
+import logging
+import threading
+from decimal import Decimal
+from boto3.dynamodb.conditions import Key
+
+logger = logging.getLogger()
+
+ORDER_SORT_KEY = "ORDER"
+ITEM_SORT_KEY_PREFIX = "ITEM#"
+# The ORDER item and its ITEM items are written in one transaction, limited to 100 actions
+MAX_TRANSACTION_ITEMS = 100
+
+def get_cart_hash(order_items):
+    """Hash of the products, quantities and prices in the cart, independent of item order and product names."""
+    cart = sorted(
+        [str(item["productId"]), int(item["quantity"]), float(item["price"])]
+        for item in order_items
+    )
+    return hashlib.sha256(json.dumps(cart, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+def get_idempotency_token(session_id, order_items):
+    """The same cart placed again in the same agent session gives the same token."""
+    return hashlib.sha256(f"{session_id}:{get_cart_hash(order_items)}".encode('utf-8')).hexdigest()
+
+def get_order_id(idempotency_token):
+    """Derive the order ID from the idempotency token, keeping the <uuid>-ORDER format."""
+    return f"{uuid.UUID(hex=idempotency_token[:32])}-ORDER"
+
+def to_dynamodb(value):
+    # DynamoDB numbers must be Decimal, floats are rejected by boto3
+    return json.loads(json.dumps(value), parse_float=Decimal)
+
+def from_dynamodb(value):
+    if isinstance(value, list):
+        return [from_dynamodb(item) for item in value]
+    if isinstance(value, dict):
+        return {key: from_dynamodb(item) for key, item in value.items()}
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+class DynamoDBOrderRepository:
+    """Orders stored in a DynamoDB table with an orderId partition key and an sk sort key.
+
+    Each order is an ORDER item holding the order details, plus one ITEM#<n> item per order
+    item. They are written in one transaction, with a condition that the ORDER item does not
+    exist yet, so a retried request finds the existing order and leaves its items untouched.
+    """
+
+    def __init__(self, table_name, dynamodb=None):
+        self.table = (dynamodb or boto3.resource('dynamodb')).Table(table_name)
+        self.client = self.table.meta.client
+
+    def create_order(self, order):
+        """Store the order and return (order, created). An existing order with the same ID is returned as is."""
+        order_id = order["id"]
+        order_items = order["order"]["orderItems"]
+        if len(order_items) + 1 > MAX_TRANSACTION_ITEMS:
+            raise ValueError(f"An order can have at most {MAX_TRANSACTION_ITEMS - 1} items")
+
+        header = {key: value for key, value in order.items() if key != "order"}
+        header["shippingAddress"] = order["order"]["shippingAddress"]
+        header["itemCount"] = len(order_items)
+        # Key attributes are set last, so fields of the order can never overwrite them
+        actions = [{"Put": {
+            "TableName": self.table.name,
+            "Item": to_dynamodb({**header, "orderId": order_id, "sk": ORDER_SORT_KEY}),
+            "ConditionExpression": "attribute_not_exists(orderId)"
+        }}]
+        for index, item in enumerate(order_items):
+            actions.append({"Put": {
+                "TableName": self.table.name,
+                "Item": to_dynamodb({**item, "orderId": order_id, "sk": f"{ITEM_SORT_KEY_PREFIX}{index:03d}"})
+            }})
+
+        try:
+            self.client.transact_write_items(TransactItems=actions)
+        except self.client.exceptions.TransactionCanceledException as e:
+            reasons = e.response.get('CancellationReasons', [])
+            if not reasons or reasons[0].get('Code') != 'ConditionalCheckFailed':
+                raise
+            logger.info(f"Order {order_id} already exists. Returning the stored order.")
+            return self.get_order(order_id), False
+        return order, True
+
+    def get_order(self, order_id):
+        """Return the order with its items, or None if it does not exist."""
+        items = []
+        kwargs = {"KeyConditionExpression": Key("orderId").eq(order_id), "ConsistentRead": True}
+        while True:
+            response = self.table.query(**kwargs)
+            items.extend(response["Items"])
+            if "LastEvaluatedKey" not in response:
+                break
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+        header = next((item for item in items if item["sk"] == ORDER_SORT_KEY), None)
+        if header is None:
+            return None
+
+        order = from_dynamodb(header)
+        order_items = [
+            {key: value for key, value in from_dynamodb(item).items() if key not in ("orderId", "sk")}
+            for item in sorted(items, key=lambda item: item["sk"]) if item["sk"].startswith(ITEM_SORT_KEY_PREFIX)
+        ]
+        shipping_address = order.pop("shippingAddress")
+        for key in ("orderId", "sk", "itemCount"):
+            order.pop(key)
+        order["order"] = {"orderItems": order_items, "shippingAddress": shipping_address}
+        return order
+
+class MemoryOrderRepository:
+    """In-process stand-in for DynamoDBOrderRepository, for running the action Lambda locally."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.orders = {}
+
+    def create_order(self, order):
+        with self.lock:
+            if order["id"] in self.orders:
+                return json.loads(self.orders[order["id"]]), False
+            self.orders[order["id"]] = json.dumps(order)
+        return order, True
+
+    def get_order(self, order_id):
+        with self.lock:
+            order = self.orders.get(order_id)
+        return json.loads(order) if order is not None else None
+
+def get_order_repository():
+    """DynamoDB when ORDERS_TABLE_NAME is set, otherwise an in-memory repository."""
+    table_name = os.environ.get('ORDERS_TABLE_NAME')
+    if table_name:
+        return DynamoDBOrderRepository(table_name)
+    logger.warning("ORDERS_TABLE_NAME is not set. Orders are kept in memory only.")
+    return MemoryOrderRepository()
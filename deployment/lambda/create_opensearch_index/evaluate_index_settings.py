@@ -0,0 +1,178 @@
+"""Measure recall@k and query latency of product vector index settings on local vectors.
+
+Exact search over the float vectors is the ground truth. With faiss installed, every
+combination of the given settings is built as a faiss HNSW graph with the same m,
+ef_construction and ef_search as the OpenSearch index. fp16 uses the faiss fp16 scalar
+quantizer. byte is deployed on the Lucene engine, which ignores ef_search and searches
+with ef equal to k, so it is modelled with the faiss 8-bit scalar quantizer searched with
+ef_search k. Without faiss the search is exact over the quantized vectors, which measures
+the recall cost of quantization alone. numpy is required.
+
+Vectors are read from a .npy file of embeddings, such as Titan embeddings of the product
+documents, or generated as clustered random vectors. Queries are perturbed copies of
+stored vectors.
+
+    pip install numpy faiss-cpu
+    python evaluate_index_settings.py --vectors embeddings.npy --m 16,32 --ef-search 64,256,512 --quantization none,fp16,byte
+"""
+import time
+import argparse
+import itertools
+from index_settings import QUANTIZATION_PROFILES, get_space_type, uses_ef_search
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+def parse_list(value, cast=str):
+    return [cast(item.strip()) for item in value.split(',') if item.strip()]
+
+def load_vectors(path, count, dimensions, clusters, seed):
+    if path:
+        vectors = np.load(path).astype(np.float32)
+        return vectors[:count] if count else vectors
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimensions)).astype(np.float32)
+    assignments = rng.integers(0, clusters, size=count)
+    return centers[assignments] + 0.35 * rng.normal(size=(count, dimensions)).astype(np.float32)
+
+def make_queries(vectors, count, noise, seed):
+    rng = np.random.default_rng(seed + 1)
+    picked = vectors[rng.choice(len(vectors), size=count, replace=False)]
+    return picked + noise * vectors.std() * rng.normal(size=picked.shape).astype(np.float32)
+
+def prepare(vectors, space_type):
+    """Return the vectors to index and the metric to search them with. Cosine is inner product on unit vectors."""
+    if space_type == "cosinesimil":
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True), "ip"
+    return vectors, "ip" if space_type == "innerproduct" else "l2"
+
+def quantize(vectors, quantization):
+    """Round trip the vectors through the quantization profile."""
+    if quantization == "fp16":
+        return vectors.astype(np.float16).astype(np.float32)
+    if quantization == "byte":
+        low, high = np.quantile(vectors, [0.001, 0.999])
+        scale = (high - low) / 127
+        return (np.round((np.clip(vectors, low, high) - low) / scale) * scale + low).astype(np.float32)
+    return vectors
+
+def exact_search(base, queries, k, metric):
+    if metric == "ip":
+        scores = queries @ base.T
+    else:
+        scores = -((queries ** 2).sum(axis=1, keepdims=True) - 2 * queries @ base.T + (base ** 2).sum(axis=1))
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+def build_faiss_index(vectors, metric, m, ef_construction, quantization):
+    faiss_metric = faiss.METRIC_INNER_PRODUCT if metric == "ip" else faiss.METRIC_L2
+    dimensions = vectors.shape[1]
+    if quantization == "none":
+        index = faiss.IndexHNSWFlat(dimensions, m, faiss_metric)
+    else:
+        quantizer = faiss.ScalarQuantizer.QT_fp16 if quantization == "fp16" else faiss.ScalarQuantizer.QT_8bit
+        index = faiss.IndexHNSWSQ(dimensions, quantizer, m, faiss_metric)
+        index.train(vectors)
+    index.hnsw.efConstruction = ef_construction
+    index.add(vectors)
+    return index
+
+def timed_search(search, queries, k):
+    """Search one query at a time, as the knowledge base does, and return (ids, latencies in ms)."""
+    ids, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        ids.append(search(query[None, :], k)[0])
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(ids), np.array(latencies)
+
+def recall_at_k(ids, truth, k):
+    return float(np.mean([len(set(found[:k]) & set(expected[:k])) / k for found, expected in zip(ids, truth)]))
+
+def estimate_megabytes(count, dimensions, m, quantization):
+    """Vector storage plus the bottom HNSW layer, which holds 2 * m neighbour ids per vector."""
+    bytes_per_value = {"none": 4, "fp16": 2, "byte": 1}[quantization]
+    return count * (dimensions * bytes_per_value + 2 * m * 4) / (1024 * 1024)
+
+def evaluate(vectors, queries, k, space_type, m, ef_construction, ef_search, quantization):
+    base, metric = prepare(vectors, space_type)
+    query_vectors, _ = prepare(queries, space_type)
+    truth = exact_search(base, query_vectors, k, metric)
+
+    start = time.perf_counter()
+    if faiss is not None:
+        index = build_faiss_index(base, metric, m, ef_construction, quantization)
+        index.hnsw.efSearch = ef_search if uses_ef_search(quantization) else k
+        search = lambda query, top_k: index.search(query, top_k)[1]
+    else:
+        quantized = quantize(base, quantization)
+        search = lambda query, top_k: exact_search(quantized, query, top_k, metric)
+    build_seconds = time.perf_counter() - start
+
+    ids, latencies = timed_search(search, query_vectors, k)
+    return {
+        "recall": round(recall_at_k(ids, truth, k), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        "build_seconds": round(build_seconds, 2),
+        "megabytes": round(estimate_megabytes(len(base), base.shape[1], m, quantization), 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--vectors', help='.npy file of embeddings, one row per document. Random clustered vectors when omitted')
+    parser.add_argument('--count', type=int, default=5000, help='Number of vectors to index')
+    parser.add_argument('--dimensions', type=int, default=1536, help='Dimensions of generated vectors')
+    parser.add_argument('--clusters', type=int, default=50, help='Clusters of generated vectors')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--noise', type=float, default=0.1, help='Query perturbation, relative to the vector standard deviation')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--space-type', default='l2', help='Comma separated: l2, cosine, innerproduct')
+    parser.add_argument('--m', default='16', help='Comma separated HNSW m values')
+    parser.add_argument('--ef-construction', default='100', help='Comma separated HNSW ef_construction values')
+    parser.add_argument('--ef-search', default='512', help='Comma separated HNSW ef_search values')
+    parser.add_argument('--quantization', default=','.join(QUANTIZATION_PROFILES), help='Comma separated: none, fp16, byte')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    if np is None:
+        parser.error("numpy is required: pip install numpy")
+
+    space_types = [get_space_type(space_type) for space_type in parse_list(args.space_type)]
+    quantizations = parse_list(args.quantization)
+    unknown = set(quantizations) - set(QUANTIZATION_PROFILES)
+    if unknown:
+        parser.error(f"Unsupported quantization {', '.join(unknown)}")
+    graph_settings = list(itertools.product(parse_list(args.m, int), parse_list(args.ef_construction, int), parse_list(args.ef_search, int)))
+    if faiss is None:
+        # Exact search does not depend on the graph settings, so each profile is only measured once
+        print("faiss is not installed, measuring exact search over quantized vectors. pip install faiss-cpu to evaluate HNSW settings")
+        graph_settings = graph_settings[:1]
+
+    vectors = load_vectors(args.vectors, args.count, args.dimensions, args.clusters, args.seed)
+    queries = make_queries(vectors, args.queries, args.noise, args.seed)
+    print(f"{len(vectors)} vectors of {vectors.shape[1]} dimensions, {len(queries)} queries, recall@{args.k}")
+    print(f"{'space':<13}{'m':>4}{'ef_c':>6}{'ef_s':>6}{'quant':>7}{'recall':>9}{'p50 ms':>9}{'p95 ms':>9}{'build s':>9}{'MB':>8}")
+    measured = set()
+    for space_type, (m, ef_construction, ef_search), quantization in itertools.product(space_types, graph_settings, quantizations):
+        if not uses_ef_search(quantization):
+            # Searched with ef equal to k whatever ef_search is, so measured once per graph
+            ef_search = args.k
+            if (space_type, m, ef_construction, quantization) in measured:
+                continue
+            measured.add((space_type, m, ef_construction, quantization))
+        result = evaluate(vectors, queries, args.k, space_type, m, ef_construction, ef_search, quantization)
+        graph = (m, ef_construction, ef_search) if faiss is not None else ('-', '-', '-')
+        print(f"{space_type:<13}{graph[0]:>4}{graph[1]:>6}{graph[2]:>6}{quantization:>7}{result['recall']:>9}"
+              f"{result['p50_ms']:>9}{result['p95_ms']:>9}{result['build_seconds']:>9}{result['megabytes']:>8}")
+
+if __name__ == '__main__':
+    main()
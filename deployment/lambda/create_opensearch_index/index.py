@@ -1,7 +1,8 @@
 import boto3
 import os
+import json
 import logging
-from typing import Sequence, TypedDict
+from typing import Optional, Sequence, TypedDict
 from urllib.parse import urlparse
 import time
 from opensearchpy import (
@@ -9,10 +10,13 @@ from opensearchpy import (
     OpenSearch,
     RequestsHttpConnection,
 )
+from index_settings import create_knn_method, uses_ef_search
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+METRICS_NAMESPACE = 'RetailShoppingAgent/OpenSearchIndex'
+
 class MetadataManagementField(TypedDict):
     MappingField: str
     DataType: str
@@ -41,19 +45,17 @@ def create_mapping(
     vector_field: str,
     dimensions: int,
     metadata_management: Sequence[MetadataManagementField],
+    space_type: str = "l2",
+    m: int = 16,
+    ef_construction: int = 100,
+    quantization: str = "none",
 ) -> dict:
     mapping = {
         "properties": {
             vector_field: {
                 "type": "knn_vector",
                 "dimension": dimensions,
-                "method": {
-                    "engine": "faiss",
-                    "space_type": "l2",
-                    "name": "hnsw",
-                    "parameters": {
-                    }
-                },
+                "method": create_knn_method(space_type, m, ef_construction, quantization),
             },
             "id": {
                 "type": "text",
@@ -68,14 +70,15 @@ def create_mapping(
         }
     return mapping
 
-def create_setting() -> dict:
+def create_setting(shards: int = 2, ef_search: Optional[int] = 512) -> dict:
     setting = {
         "index": {
-            "number_of_shards": "2",
-            "knn.algo_param": {"ef_search": "512"},
+            "number_of_shards": str(shards),
             "knn": "true",
         },
     }
+    if ef_search is not None:
+        setting["index"]["knn.algo_param"] = {"ef_search": str(ef_search)}
     return setting
 
 def create_or_update_index(
@@ -105,9 +108,70 @@ def create_or_update_index(
             },
             params={"wait_for_active_shards": "all"},
         )
-    
-    logger.debug(f"Sleep for 30 seconds for Bedrock KB {index_name}")
-    time.sleep(30)
+
+def get_index_readiness(client: OpenSearch, index_name: str, vector_field: str, dimensions: int) -> Optional[str]:
+    """Return None when the index can serve kNN queries, otherwise the reason it cannot yet."""
+    if not client.indices.exists(index_name):
+        return "index does not exist"
+
+    mappings = client.indices.get_mapping(index=index_name)
+    properties = next(iter(mappings.values()), {}).get("mappings", {}).get("properties", {})
+    if vector_field not in properties:
+        return f"vector field {vector_field} is not in the mapping"
+
+    # A unit vector, since a zero vector is rejected by cosine similarity
+    query_vector = [1.0] + [0.0] * (dimensions - 1)
+    client.search(
+        index=index_name,
+        body={"size": 1, "_source": False, "query": {"knn": {vector_field: {"vector": query_vector, "k": 1}}}}
+    )
+    return None
+
+def wait_for_index_ready(
+    client: OpenSearch, index_name: str, vector_field: str, dimensions: int,
+    timeout_seconds: float, initial_delay: float = 1, max_delay: float = 10
+) -> float:
+    """Poll the index until it exists, shows the vector field and answers a kNN query. Returns the seconds waited.
+
+    Polls back off exponentially from initial_delay to max_delay. Raises TimeoutError if the index
+    is not ready within timeout_seconds.
+    """
+    start = time.monotonic()
+    delay = initial_delay
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            reason = get_index_readiness(client, index_name, vector_field, dimensions)
+        except Exception as e:
+            reason = str(e)
+
+        elapsed = time.monotonic() - start
+        if reason is None:
+            logger.info(f"Index {index_name} is ready after {elapsed:.1f}s and {attempt} checks")
+            return elapsed
+
+        remaining = timeout_seconds - elapsed
+        if remaining <= 0:
+            raise TimeoutError(f"Index {index_name} was not ready after {elapsed:.1f}s: {reason}")
+        logger.info(f"Index {index_name} is not ready yet ({reason}), checking again in {min(delay, remaining):.1f}s")
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+def emit_index_ready_metric(index_name: str, seconds: float) -> None:
+    """Write the time the index took to become ready as a CloudWatch Embedded Metric Format log line."""
+    print(json.dumps({
+        "IndexName": index_name,
+        "IndexReadySeconds": round(seconds, 2),
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [["IndexName"]],
+                "Metrics": [{"Name": "IndexReadySeconds", "Unit": "Seconds"}]
+            }]
+        }
+    }))
 
 def handler(event, context):
     index_name = os.environ['INDEX_NAME']
@@ -116,6 +180,15 @@ def handler(event, context):
     dimensions = os.environ['VECTOR_DIMENSION']
     text_field = os.environ['TEXT_FIELD']
     metadata_field = os.environ['METADATA_FIELD'] 
+    # HNSW graph and quantization settings. The stack only invokes this function when it creates the index
+    space_type = os.environ.get('INDEX_SPACE_TYPE', 'l2')
+    hnsw_m = int(os.environ.get('HNSW_M', '16'))
+    hnsw_ef_construction = int(os.environ.get('HNSW_EF_CONSTRUCTION', '100'))
+    hnsw_ef_search = int(os.environ.get('HNSW_EF_SEARCH', '512'))
+    index_shards = int(os.environ.get('INDEX_SHARDS', '2'))
+    quantization = os.environ.get('INDEX_QUANTIZATION', 'none')
+    # Longest wait for the index to serve queries, kept below the function timeout
+    ready_timeout_seconds = float(os.environ.get('INDEX_READY_TIMEOUT_SECONDS', '240'))
 
     aoss_endpoint_name  = ''
 
@@ -141,11 +214,17 @@ def handler(event, context):
 
     try:
         client = connect_opensearch(aoss_endpoint_name)
-        mapping = create_mapping(vector_field, dimensions, metadata_management)
-        setting = create_setting()
+        mapping = create_mapping(vector_field, dimensions, metadata_management, space_type, hnsw_m, hnsw_ef_construction, quantization)
+        if not uses_ef_search(quantization):
+            logger.warning(f"ef_search {hnsw_ef_search} is not used with {quantization} quantization, the Lucene engine searches with ef equal to k")
+        setting = create_setting(index_shards, hnsw_ef_search if uses_ef_search(quantization) else None)
 
         create_or_update_index(client, index_name, mapping, setting)
 
+        # Return as soon as the index can serve, so the knowledge base is only created against a usable index
+        ready_seconds = wait_for_index_ready(client, index_name, vector_field, int(dimensions), ready_timeout_seconds)
+        emit_index_ready_metric(index_name, ready_seconds)
+
     except Exception as e:
         logger.error(f"Error creating or updating index {index_name}")
         logger.exception(e)
@@ -0,0 +1,44 @@
+# Accepted space type names and the OpenSearch name of each
+SPACE_TYPES = {
+    "l2": "l2",
+    "cosine": "cosinesimil",
+    "cosinesimil": "cosinesimil",
+    "innerproduct": "innerproduct",
+}
+
+# none keeps 32-bit floats. fp16 halves vector memory with the faiss scalar quantizer. byte uses the
+# Lucene engine's built-in scalar quantizer, since faiss byte vectors must already be quantized when
+# indexed and the knowledge base writes float embeddings.
+QUANTIZATION_PROFILES = ("none", "fp16", "byte")
+
+def get_engine(quantization: str) -> str:
+    return "lucene" if quantization == "byte" else "faiss"
+
+def uses_ef_search(quantization: str) -> bool:
+    """Only the faiss engine reads the index ef_search setting. Lucene searches each graph with ef equal to k."""
+    return get_engine(quantization) == "faiss"
+
+def get_space_type(space_type: str) -> str:
+    if space_type not in SPACE_TYPES:
+        raise ValueError(f"Unsupported space type {space_type}, expected one of {', '.join(SPACE_TYPES)}")
+    return SPACE_TYPES[space_type]
+
+def create_knn_method(space_type: str, m: int, ef_construction: int, quantization: str) -> dict:
+    """Return the knn_vector method for an HNSW graph with the given parameters and quantization profile."""
+    if quantization not in QUANTIZATION_PROFILES:
+        raise ValueError(f"Unsupported quantization {quantization}, expected one of {', '.join(QUANTIZATION_PROFILES)}")
+
+    method = {
+        "engine": get_engine(quantization),
+        "space_type": get_space_type(space_type),
+        "name": "hnsw",
+        "parameters": {
+            "m": m,
+            "ef_construction": ef_construction
+        },
+    }
+    if quantization == "fp16":
+        method["parameters"]["encoder"] = {"name": "sq", "parameters": {"type": "fp16"}}
+    elif quantization == "byte":
+        method["parameters"]["encoder"] = {"name": "sq"}
+    return method
@@ -0,0 +1,53 @@
+import os
+import json
+import html
+import logging
+import boto3
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+ses = boto3.client('sesv2')
+sender_email = os.environ.get('SENDER_EMAIL')
+store_name = os.environ.get('STORE_NAME', 'AnyCompanyCommerce')
+
+def render_email(message):
+    """Return (subject, text, html) for a queued confirmation email.
+
+    The agent writes the body as plain text, with literal \\n sequences in places.
+    """
+    text = message['emailBody'].replace('\\n', '\n').strip()
+    paragraphs = [html.escape(paragraph).replace('\n', '<br>') for paragraph in text.split('\n\n') if paragraph.strip()]
+    body_html = "<html><body>" + "".join(f"<p>{paragraph}</p>" for paragraph in paragraphs) + "</body></html>"
+    return f"Your {store_name} order {message['orderId']}", text, body_html
+
+def send_email(message):
+    subject, text, body_html = render_email(message)
+    ses.send_email(
+        FromEmailAddress=sender_email,
+        Destination={'ToAddresses': [message['email']]},
+        Content={'Simple': {
+            'Subject': {'Data': subject, 'Charset': 'UTF-8'},
+            'Body': {
+                'Text': {'Data': text, 'Charset': 'UTF-8'},
+                'Html': {'Data': body_html, 'Charset': 'UTF-8'}
+            }
+        }}
+    )
+
+def handler(event, context):
+    """Send a batch of queued order confirmation emails.
+
+    Failed messages are reported back so only they return to the queue. After the queue's
+    maximum receive count they are moved to the dead letter queue.
+    """
+    failures = []
+    for record in event['Records']:
+        try:
+            message = json.loads(record['body'])
+            send_email(message)
+            logger.info(f"Sent confirmation email for order {message['orderId']}")
+        except Exception as e:
+            logger.error(f"Failed to send email for message {record['messageId']}: {e}")
+            failures.append({"itemIdentifier": record['messageId']})
+    return {"batchItemFailures": failures}
@@ -0,0 +1,68 @@
+import json
+import boto3
+import logging
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+s3 = boto3.client('s3')
+
+# Header line that starts every product record in a shard file, written by the
+# upload_product_catalog_and_sync_kb Lambda (document_renderer.SHARD_RECORD_PREFIX)
+SHARD_RECORD_PREFIX = "### PRODUCT "
+
+def split_shard(content):
+    """Split a shard into product records and return one (text, metadata) pair per product.
+
+    Content without record headers, such as a non-shard document, is returned as a single record.
+    """
+    records = []
+    metadata, lines = None, []
+    for line in content.splitlines(keepends=True):
+        if line.startswith(SHARD_RECORD_PREFIX):
+            if lines:
+                records.append(("".join(lines), metadata))
+            metadata, lines = json.loads(line[len(SHARD_RECORD_PREFIX):]), []
+        else:
+            lines.append(line)
+    if lines:
+        records.append(("".join(lines), metadata))
+    return records
+
+def split_content_batch(content_batch):
+    """Replace every shard chunk in a content batch with one chunk per product, carrying the product metadata."""
+    file_contents = []
+    for chunk in content_batch['fileContents']:
+        for text, metadata in split_shard(chunk['contentBody']):
+            file_contents.append({
+                "contentBody": text,
+                "contentType": chunk.get('contentType', 'string'),
+                "contentMetadata": {**chunk.get('contentMetadata', {}), **(metadata or {})}
+            })
+    return {"fileContents": file_contents}
+
+def handler(event, context):
+    """Knowledge base POST_CHUNKING custom transformation for the sharded product catalog layout."""
+    bucket = event['bucketName']
+    output_files = []
+    chunk_count = 0
+
+    for input_file in event['inputFiles']:
+        output_batches = []
+        for batch in input_file['contentBatches']:
+            response = s3.get_object(Bucket=bucket, Key=batch['key'])
+            content_batch = split_content_batch(json.loads(response['Body'].read().decode('utf-8')))
+            chunk_count += len(content_batch['fileContents'])
+
+            output_key = f"output/{batch['key']}"
+            s3.put_object(Bucket=bucket, Key=output_key, Body=json.dumps(content_batch), ContentType='application/json')
+            output_batches.append({"key": output_key})
+
+        output_files.append({
+            "originalFileLocation": input_file['originalFileLocation'],
+            "fileMetadata": input_file.get('fileMetadata', {}),
+            "contentBatches": output_batches
+        })
+
+    logger.info(f"Split {len(output_files)} files into {chunk_count} product chunks for ingestion job {event.get('ingestionJobId')}")
+    return {"outputFiles": output_files}
@@ -0,0 +1,93 @@
+"""Compare the document and sharded KB layouts against an in-memory S3 stand-in.
+
+Each layout is uploaded with the sync Lambda's rendering and upload code, then a crawl
+modelled on a knowledge base ingestion job lists the data source prefix, reads every
+document with its metadata file and counts the product chunks it yields. Every S3 request
+pays --latency-ms, so the timings show the per-object overhead of each layout.
+
+    python benchmark_layouts.py --catalog ../../data/products.json --latency-ms 5
+"""
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+import index
+from local_clients import LocalS3Client
+from document_renderer import DocumentRenderer, SHARD_RECORD_PREFIX
+from s3_uploader import ConcurrentUploader
+
+BUCKET = 'benchmark-bucket'
+PREFIX = 'product-catalog'
+
+def list_keys(s3, prefix):
+    keys, token = [], None
+    while True:
+        response = s3.list_objects_v2(Bucket=BUCKET, Prefix=prefix, **({"ContinuationToken": token} if token else {}))
+        keys.extend(item['Key'] for item in response['Contents'])
+        if not response['IsTruncated']:
+            return keys
+        token = response['NextContinuationToken']
+
+def crawl(s3, concurrency):
+    """Read every document and its metadata file like an ingestion job and return the number of chunks."""
+    keys = list_keys(s3, f"{PREFIX}/")
+    documents = [key for key in keys if key.endswith('.txt')]
+
+    def read_document(key):
+        text = s3.get_object(Bucket=BUCKET, Key=key)['Body'].read().decode('utf-8')
+        s3.get_object(Bucket=BUCKET, Key=f"{key}.metadata.json")
+        return max(1, text.count(SHARD_RECORD_PREFIX))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return sum(executor.map(read_document, documents))
+
+def run_layout(layout, products, latency_ms, upload_concurrency, crawl_concurrency):
+    s3 = LocalS3Client(latency_ms=latency_ms)
+    renderer = DocumentRenderer('https://cdn.example.com', 'https://app.example.com')
+    if layout == 'sharded':
+        documents = index.render_shard_documents(renderer, PREFIX, products)
+    else:
+        documents = index.render_product_documents(renderer, PREFIX, products)
+
+    uploader = ConcurrentUploader(s3, BUCKET, max_workers=upload_concurrency)
+    upload_stats = uploader.upload_all(file for _, files in documents for file in files)
+    upload_requests = s3.request_count
+
+    start = time.perf_counter()
+    chunks = crawl(s3, crawl_concurrency)
+    crawl_seconds = time.perf_counter() - start
+
+    return {
+        "layout": layout,
+        "objects": upload_stats['uploaded'],
+        "upload_seconds": upload_stats['seconds'],
+        "crawl_requests": s3.request_count - upload_requests,
+        "crawl_seconds": round(crawl_seconds, 2),
+        "chunks": chunks
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--catalog', default=os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'products.json'))
+    parser.add_argument('--latency-ms', type=float, default=5, help='Latency added to every S3 request')
+    parser.add_argument('--upload-concurrency', type=int, default=32)
+    parser.add_argument('--crawl-concurrency', type=int, default=8)
+    parser.add_argument('--shard-max-bytes', type=int, default=index.shard_max_bytes)
+    args = parser.parse_args()
+
+    with open(args.catalog, encoding='utf-8') as f:
+        products = json.load(f)
+    index.shard_max_bytes = args.shard_max_bytes
+
+    print(f"{len(products)} products, {args.latency_ms} ms per S3 request")
+    print(f"{'layout':<10}{'objects':>9}{'upload s':>10}{'crawl req':>11}{'crawl s':>9}{'chunks':>8}")
+    for layout in ('document', 'sharded'):
+        result = run_layout(layout, products, args.latency_ms, args.upload_concurrency, args.crawl_concurrency)
+        print(f"{result['layout']:<10}{result['objects']:>9}{result['upload_seconds']:>10}{result['crawl_requests']:>11}{result['crawl_seconds']:>9}{result['chunks']:>8}")
+
+if __name__ == '__main__':
+    main()
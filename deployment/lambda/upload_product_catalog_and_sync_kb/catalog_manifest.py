@@ -0,0 +1,54 @@
+import json
+import hashlib
+import logging
+
+logger = logging.getLogger()
+
+# S3 DeleteObjects accepts at most 1000 keys per request
+DELETE_BATCH_SIZE = 1000
+
+def hash_files(files):
+    """Content hash of the (key, body) pairs rendered for one product."""
+    digest = hashlib.sha256()
+    for key, body in files:
+        digest.update(key.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(body.encode('utf-8') if isinstance(body, str) else body)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def load_manifest(s3, bucket, key):
+    """Return the {document_id: content_hash} manifest of the last sync, or an empty one on first sync.
+
+    Document ids are product ids, or shard ids in the sharded layout.
+    """
+    try:
+        response = s3.get_object(Bucket=bucket, Key=key)
+    except s3.exceptions.NoSuchKey:
+        logger.info(f"No catalog manifest found at s3://{bucket}/{key}. Running a full sync.")
+        return {}
+
+    manifest = json.loads(response['Body'].read().decode('utf-8'))
+    logger.info(f"Loaded catalog manifest with {len(manifest['products'])} documents from s3://{bucket}/{key}")
+    return manifest['products']
+
+def save_manifest(s3, bucket, key, products):
+    s3.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps({"version": 1, "products": products}, separators=(',', ':')),
+        ContentType='application/json'
+    )
+    logger.info(f"Saved catalog manifest with {len(products)} documents to s3://{bucket}/{key}")
+
+def delete_objects(s3, bucket, keys):
+    """Delete keys in batches and return the keys that could not be deleted."""
+    failed = []
+    for i in range(0, len(keys), DELETE_BATCH_SIZE):
+        batch = keys[i:i + DELETE_BATCH_SIZE]
+        response = s3.delete_objects(
+            Bucket=bucket,
+            Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+        )
+        failed.extend(error['Key'] for error in response.get('Errors', []))
+    return failed
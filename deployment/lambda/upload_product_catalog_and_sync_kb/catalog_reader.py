@@ -0,0 +1,98 @@
+import json
+import codecs
+import logging
+
+logger = logging.getLogger()
+
+READ_CHUNK_SIZE = 64 * 1024
+
+class CatalogStreamReader:
+    """Incrementally decodes a UTF-8 byte stream, such as an S3 StreamingBody, into a text buffer."""
+
+    def __init__(self, stream, chunk_size=READ_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Append the next chunk of the stream to the buffer, dropping the text already consumed."""
+        if self.pos:
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+        self.buffer += self.decoder.decode(chunk or b'', final=self.eof)
+
+    def skip_whitespace(self):
+        """Advance to the next non-whitespace character and return it, or None at the end of the stream."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                return None
+            self.fill()
+
+def decode_value(reader, decoder):
+    """Decode the JSON value at the reader position, reading more of the stream until it is complete."""
+    # A bare number may continue in the next chunk, so read on until its terminating character
+    if reader.buffer[reader.pos] in '-0123456789':
+        while not reader.eof and not any(c in reader.buffer[reader.pos:] for c in ',] \t\r\n'):
+            reader.fill()
+
+    while True:
+        try:
+            value, end = decoder.raw_decode(reader.buffer, reader.pos)
+        except json.JSONDecodeError:
+            if reader.eof:
+                raise
+            reader.fill()
+            continue
+        reader.pos = end
+        return value
+
+def iter_json_array(stream, chunk_size=READ_CHUNK_SIZE):
+    """Yield the items of a top-level JSON array one at a time without loading the whole document."""
+    reader = CatalogStreamReader(stream, chunk_size)
+    decoder = json.JSONDecoder()
+
+    if reader.skip_whitespace() != '[':
+        raise ValueError("Product catalog must be a JSON array")
+    reader.pos += 1
+
+    if reader.skip_whitespace() == ']':
+        return
+    while True:
+        if reader.skip_whitespace() is None:
+            raise ValueError("Unexpected end of product catalog")
+        yield decode_value(reader, decoder)
+
+        separator = reader.skip_whitespace()
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError(f"Expected ',' or ']' in product catalog, found {separator!r}")
+        reader.pos += 1
+
+def iter_json_lines(stream):
+    """Yield one item per non-empty line of a JSON Lines document."""
+    for line_number, line in enumerate(stream.iter_lines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON on line {line_number} of product catalog: {e}") from e
+
+def iter_products(stream, key):
+    """Stream products from a .json array or .jsonl catalog object."""
+    if key.endswith('.jsonl'):
+        logger.info(f"Streaming JSON Lines product catalog {key}")
+        return iter_json_lines(stream)
+    logger.info(f"Streaming JSON array product catalog {key}")
+    return iter_json_array(stream)
@@ -0,0 +1,33 @@
+import zlib
+import logging
+
+logger = logging.getLogger()
+
+def get_shard_bucket(product_id, shard_buckets):
+    """Stable bucket of a product, so a changed product only rewrites the shards of its own bucket."""
+    return zlib.crc32(product_id.encode('utf-8')) % shard_buckets
+
+def iter_shards(renderer, products, shard_buckets, shard_max_bytes):
+    """Yield (shard_id, text) pairs of size-bounded shard files.
+
+    Products are grouped into hash buckets in catalog order. A bucket's records are yielded as
+    a part as soon as the next record would take it over shard_max_bytes, so at most one open
+    part per bucket, shard_buckets * shard_max_bytes of text, is held in memory whatever the
+    size of the catalog. A single record larger than shard_max_bytes gets a part of its own.
+    """
+    parts = [0] * shard_buckets
+    sizes = [0] * shard_buckets
+    records = [[] for _ in range(shard_buckets)]
+    for product in products:
+        record = renderer.render_shard_record(product)
+        record_size = len(record.encode('utf-8'))
+        bucket = get_shard_bucket(product['id'], shard_buckets)
+        if records[bucket] and sizes[bucket] + record_size > shard_max_bytes:
+            yield f"shards/{bucket:04d}-{parts[bucket]:03d}", "".join(records[bucket])
+            parts[bucket], sizes[bucket], records[bucket] = parts[bucket] + 1, 0, []
+        records[bucket].append(record)
+        sizes[bucket] += record_size
+
+    for bucket in range(shard_buckets):
+        if records[bucket]:
+            yield f"shards/{bucket:04d}-{parts[bucket]:03d}", "".join(records[bucket])
@@ -0,0 +1,146 @@
+import ast
+import json
+import string
+import logging
+from collections import defaultdict
+
+logger = logging.getLogger()
+
+# Rough characters per token of English product text, used to estimate embedding and prompt size
+CHARS_PER_TOKEN = 4
+
+GENDER_AFFINITY = {"M": "men", "F": "women"}
+
+# Header line that starts every product record in a shard file. The split_product_shards
+# transformation Lambda splits shards on this prefix, keep both in sync.
+SHARD_RECORD_PREFIX = "### PRODUCT "
+
+# Embedded text templates, one line per entry. A line is left out when any field it uses is empty.
+# Only fields that help retrieval are embedded: URLs, images and stock live in the metadata file.
+# Price stays in the text because agents only see the retrieved text and quote it in their answers.
+DEFAULT_TEMPLATE = (
+    "{name}",
+    "Product ID: {id}",
+    "Category: {category}, {style}",
+    "Price: ${price}",
+    "Also known as: {aliases}",
+    "{description}"
+)
+GENDERED_TEMPLATE = DEFAULT_TEMPLATE[:4] + ("For: {gender}",) + DEFAULT_TEMPLATE[4:]
+CATEGORY_TEMPLATES = {
+    "apparel": GENDERED_TEMPLATE,
+    "footwear": GENDERED_TEMPLATE,
+    "accessories": GENDERED_TEMPLATE,
+    "jewelry": GENDERED_TEMPLATE,
+    "beauty": GENDERED_TEMPLATE
+}
+
+def parse_aliases(aliases):
+    """Aliases are stored as a Python list literal string such as "['soda', 'cola']"."""
+    if isinstance(aliases, list):
+        return [str(alias) for alias in aliases]
+    if not aliases:
+        return []
+    try:
+        parsed = ast.literal_eval(aliases)
+    except (ValueError, SyntaxError):
+        return [aliases]
+    return [str(alias) for alias in parsed] if isinstance(parsed, (list, tuple)) else [str(parsed)]
+
+def estimate_tokens(text):
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+class TokenStats:
+    """Running totals of the estimated token counts of rendered documents, overall and per category."""
+
+    def __init__(self):
+        self.documents = 0
+        self.total_tokens = 0
+        self.max_tokens = 0
+        self.category_totals = defaultdict(lambda: [0, 0])
+
+    def add(self, category, text):
+        tokens = estimate_tokens(text)
+        self.documents += 1
+        self.total_tokens += tokens
+        self.max_tokens = max(self.max_tokens, tokens)
+        self.category_totals[category][0] += 1
+        self.category_totals[category][1] += tokens
+
+    def summary(self):
+        return {
+            "documents": self.documents,
+            "estimated_tokens": self.total_tokens,
+            "avg_tokens": round(self.total_tokens / self.documents, 1) if self.documents else 0,
+            "max_tokens": self.max_tokens,
+            "avg_tokens_by_category": {
+                category: round(tokens / count, 1) for category, (count, tokens) in sorted(self.category_totals.items())
+            }
+        }
+
+class DocumentRenderer:
+    """Renders a product into the text embedded in the knowledge base and its filterable metadata.
+
+    Templates are chosen by product category and can be replaced or extended by passing
+    category_templates and default_template.
+    """
+
+    def __init__(self, cloudfront_url, app_url, category_templates=CATEGORY_TEMPLATES, default_template=DEFAULT_TEMPLATE):
+        self.cloudfront_url = cloudfront_url
+        self.app_url = app_url
+        self.category_templates = category_templates
+        self.default_template = default_template
+        self.token_stats = TokenStats()
+        self.formatter = string.Formatter()
+
+    def get_fields(self, product):
+        return {
+            "id": product['id'],
+            "name": product.get('name', ''),
+            "category": product.get('category', ''),
+            "style": product.get('style', ''),
+            "price": product.get('price', ''),
+            "gender": GENDER_AFFINITY.get(product.get('gender_affinity'), ''),
+            "aliases": ", ".join(parse_aliases(product.get('aliases'))),
+            "description": product.get('description', '')
+        }
+
+    def render_text(self, product):
+        fields = self.get_fields(product)
+        lines = []
+        for line in self.category_templates.get(fields['category'], self.default_template):
+            names = [name for _, name, _, _ in self.formatter.parse(line) if name]
+            if all(fields.get(name) not in (None, '') for name in names):
+                lines.append(line.format_map(fields))
+
+        text = "\n".join(lines) + "\n"
+        self.token_stats.add(fields['category'], text)
+        return text
+
+    def render_metadata(self, product):
+        return json.dumps({"metadataAttributes": self.get_metadata_attributes(product)})
+
+    def render_shard_record(self, product):
+        """A product record for a shard file: a header line with the metadata attributes followed by the text."""
+        metadata = json.dumps(self.get_metadata_attributes(product), separators=(',', ':'))
+        return f"{SHARD_RECORD_PREFIX}{metadata}\n{self.render_text(product)}"
+
+    def get_metadata_attributes(self, product):
+        attributes = {
+            "product_id": product['id'],
+            "category": product['category'],
+            "style": product['style'],
+            "price": float(product['price']),
+            "promoted": product['promoted'],
+            "featured": product['featured'],
+            "image_url": f"{self.cloudfront_url}/images/{product['image']}",
+            "url": f"{self.app_url}/product/?product_id={product['id']}"
+        }
+        if product.get('current_stock') is not None:
+            attributes['current_stock'] = int(product['current_stock'])
+        if product.get('gender_affinity'):
+            attributes['gender_affinity'] = product['gender_affinity']
+        aliases = parse_aliases(product.get('aliases'))
+        if aliases:
+            attributes['aliases'] = aliases
+        return attributes
@@ -3,12 +3,37 @@ import os
 import boto3
 import logging
 import urllib
+from botocore.config import Config
+from s3_uploader import ConcurrentUploader
+import catalog_manifest
+import catalog_reader
+import catalog_shards
+from document_renderer import DocumentRenderer
+import kb_ingestion
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
-s3 = boto3.client('s3')
+# Number of parallel S3 uploads. The connection pool is sized to match, and adaptive retries
+# back off and rate limit the client when S3 answers with SlowDown
+upload_concurrency = int(os.environ.get('UPLOAD_CONCURRENCY', '32'))
+s3 = boto3.client('s3', config=Config(
+    max_pool_connections=upload_concurrency,
+    retries={'max_attempts': 10, 'mode': 'adaptive'}
+))
 bedrock_agent = boto3.client('bedrock-agent')
+# Deltas up to this many documents skip the ingestion job and use the direct document ingest API
+direct_ingestion_max_documents = int(os.environ.get('DIRECT_INGESTION_MAX_DOCUMENTS', '50'))
+# Poll a started ingestion job until it finishes, within the remaining invocation time. Disable when
+# a Step Functions state machine polls the job with the checkIngestion action instead
+wait_for_ingestion = os.environ.get('WAIT_FOR_INGESTION', 'true').lower() == 'true'
+# Time kept free at the end of the invocation to report the result
+ingestion_wait_margin_seconds = 15
+# "document" writes a text and metadata file per product. "sharded" packs products into size-bounded
+# shard files that the data source's transformation Lambda splits back into one chunk per product
+document_layout = os.environ.get('DOCUMENT_LAYOUT', 'document')
+shard_buckets = int(os.environ.get('SHARD_BUCKETS', '64'))
+shard_max_bytes = int(os.environ.get('SHARD_MAX_BYTES', str(1024 * 1024)))
 aws_session_token = os.environ.get('AWS_SESSION_TOKEN')
 parameters_http_port = 2773
 
@@ -35,82 +60,144 @@ def get_ssm_parameter(param_name):
         logger.error(f"An unexpected error occurred: {e}")
         return ""
 
-def upload_product_files(source_bucket, cloudfront_url, app_url, bucket_prefix, products):
-    logger.info(f"Starting to upload product files to bucket: {source_bucket}")
+def get_document_keys(bucket_prefix, document_id):
+    return [f"{bucket_prefix}/{document_id}.txt", f"{bucket_prefix}/{document_id}.txt.metadata.json"]
+
+def render_product_documents(renderer, bucket_prefix, products):
+    """Yield (product_id, files) with the (key, body) pairs of the KB document and metadata file of each product."""
     for product in products:
-        product_text = f"""id: {product['id']}
-name: {product['name']}
-description: {product['description']}
-category: {product['category']}
-style: {product['style']}
-aliases: {product['aliases']}
-price: {product['price']}
-promoted: {product['promoted']}
-featured: {product['featured']}
-gender_affinity: {product['gender_affinity']}
-image: {cloudfront_url}/images/{product['image']}
-url: {app_url}/product/?product_id={product['id']}
-"""
-        s3.put_object(
-            Bucket=source_bucket,
-            Key=f"{bucket_prefix}/{product['id']}.txt",
-            Body=product_text
-        )
-        logger.debug(f"Uploaded product text file for product ID: {product['id']}")
-
-        metadata = {
-            "metadataAttributes": {
-                "category": product['category'],
-                "style": product['style'],
-                "price": str(product['price']),
-                "promoted": product['promoted'],
-                "featured": product['featured']
-            }
-        }
-        s3.put_object(
-            Bucket=source_bucket,
-            Key=f"{bucket_prefix}/{product['id']}.txt.metadata.json",
-            Body=json.dumps(metadata)
-        )
-        logger.debug(f"Uploaded metadata file for product ID: {product['id']}")
-    
-    logger.info("Finished uploading all product files")
-    return {"message": "All product files uploaded successfully"}
-
-def start_knowledge_base_ingestion(knowledge_base_id, data_source_id):
-    if not knowledge_base_id or not data_source_id:
-        logger.warning("Knowledge base ID or data source ID is missing. Skipping ingestion job.")
-        return {"message": "Ingestion job not started due to missing IDs"}
-
-    logger.info(f"Starting ingestion job for knowledge base ID: {knowledge_base_id} and data source ID: {data_source_id}")
-    response = bedrock_agent.start_ingestion_job(
-        knowledgeBaseId=knowledge_base_id,
-        dataSourceId=data_source_id
-    )
-
-    ingestion_job = response.get('ingestionJob', {})
-        
-    logger.info(f"Ingestion job started successfully. Job ID: {ingestion_job.get('ingestionJobId', 'N/A')}, Job Status: {ingestion_job.get('status', 'N/A')}")
-    return {"message": "Ingestion job started successfully", "jobId": ingestion_job.get('ingestionJobId', 'N/A')}
+        text_key, metadata_key = get_document_keys(bucket_prefix, product['id'])
+        yield product['id'], [(text_key, renderer.render_text(product)), (metadata_key, renderer.render_metadata(product))]
+
+def render_shard_documents(renderer, bucket_prefix, products):
+    """Yield (shard_id, files) for the shard files of the catalog. Per product metadata is kept in the shard records."""
+    for shard_id, text in catalog_shards.iter_shards(renderer, products, shard_buckets, shard_max_bytes):
+        text_key, metadata_key = get_document_keys(bucket_prefix, shard_id)
+        yield shard_id, [(text_key, text), (metadata_key, json.dumps({"metadataAttributes": {"layout": "sharded"}}))]
+
+def get_changed_files(documents, previous_manifest, manifest, changes, full_sync=False):
+    """Yield the files of documents that are new or changed since the previous manifest, or of all documents on a full sync.
+
+    The content hash of every document is recorded in manifest and the ids of added and
+    changed documents in changes.
+    """
+    for document_id, files in documents:
+        content_hash = catalog_manifest.hash_files(files)
+        manifest[document_id] = content_hash
+
+        if document_id not in previous_manifest:
+            changes['added'].append(document_id)
+        elif full_sync or previous_manifest[document_id] != content_hash:
+            changes['changed'].append(document_id)
+        else:
+            continue
+        yield from files
+
+def delete_documents(source_bucket, bucket_prefix, document_ids):
+    keys = [key for document_id in document_ids for key in get_document_keys(bucket_prefix, document_id)]
+    failed_keys = catalog_manifest.delete_objects(s3, source_bucket, keys)
+    if failed_keys:
+        raise RuntimeError(f"Failed to delete {len(failed_keys)} product files, first failures: {failed_keys[:10]}")
+
+def upload_product_files(source_bucket, renderer, bucket_prefix, documents, previous_manifest, full_sync=False):
+    """Upload the files of added and changed documents and delete the files of removed documents."""
+    logger.info(f"Starting to upload {document_layout} layout product files to bucket: {source_bucket} with {upload_concurrency} parallel uploads")
+    manifest = {}
+    changes = {"added": [], "changed": [], "removed": []}
+
+    uploader = ConcurrentUploader(s3, source_bucket, max_workers=upload_concurrency)
+    stats = uploader.upload_all(get_changed_files(documents, previous_manifest, manifest, changes, full_sync))
+
+    if stats['failed']:
+        raise RuntimeError(f"Failed to upload {stats['failed']} product files, first failures: {uploader.failed_keys[:10]}")
+
+    changes['removed'] = [document_id for document_id in previous_manifest if document_id not in manifest]
+    if changes['removed']:
+        delete_documents(source_bucket, bucket_prefix, changes['removed'])
+
+    summary = {change_type: len(document_ids) for change_type, document_ids in changes.items()}
+    token_stats = renderer.token_stats.summary()
+    logger.info(f"Finished syncing product files. Documents: {len(manifest)}, changes: {summary}, product tokens: {token_stats}")
+    return {"message": "Product files synced successfully", "stats": stats, "changes": summary, "token_stats": token_stats}, manifest, changes
+
+def remove_layout(source_bucket, bucket_prefix, manifest_key):
+    """Delete the documents written by a previously used layout. Returns the number of documents removed."""
+    document_ids = list(catalog_manifest.load_manifest(s3, source_bucket, manifest_key))
+    if document_ids:
+        logger.info(f"Removing {len(document_ids)} documents of the previous document layout listed in {manifest_key}")
+        delete_documents(source_bucket, bucket_prefix, document_ids)
+        catalog_manifest.save_manifest(s3, source_bucket, manifest_key, {})
+    return len(document_ids)
+
+def track_ingestion_job(knowledge_base_id, data_source_id, ingestion_job_id, timeout_seconds=0):
+    """Return the ingestion job summary, waiting up to timeout_seconds for it to finish, and publish its metrics once done."""
+    if timeout_seconds > 0:
+        job = kb_ingestion.wait_for_ingestion_job(bedrock_agent, knowledge_base_id, data_source_id, ingestion_job_id, timeout_seconds)
+    else:
+        job = kb_ingestion.get_ingestion_job(bedrock_agent, knowledge_base_id, data_source_id, ingestion_job_id)
+
+    summary = kb_ingestion.get_ingestion_job_summary(job)
+    if summary['done']:
+        kb_ingestion.emit_ingestion_metrics(knowledge_base_id, summary)
+        logger.info(f"Ingestion job {ingestion_job_id} finished with status {summary['status']} in {summary.get('wallTimeSeconds', 'N/A')}s. Statistics: {summary['statistics']}")
+    return summary
 
 def handler(event, context):
-    source_bucket = os.environ['BUCKET_NAME']
-    bucket_prefix = os.environ['BUCKET_PREFIX']
     knowledge_base_id = os.environ.get('KNOWLEDGE_BASE_ID')
     data_source_id = os.environ.get('DATA_SOURCE_ID')
+
+    # Step Functions polling: {"action": "checkIngestion", "jobId": "..."} returns the job status with a "done" flag
+    if event.get('action') == 'checkIngestion':
+        return track_ingestion_job(knowledge_base_id, data_source_id, event['jobId'])
+
+    source_bucket = os.environ['BUCKET_NAME']
+    bucket_prefix = os.environ['BUCKET_PREFIX']
+    manifest_key = os.environ.get('MANIFEST_KEY', f"manifests/{bucket_prefix}.json")
+    # Each layout keeps its own manifest so that switching layouts can remove the documents of the other one
+    layout_manifest_keys = {
+        "document": manifest_key,
+        "sharded": manifest_key.removesuffix('.json') + '-sharded.json'
+    }
+    # products.json (JSON array) or products.jsonl (one product per line)
+    catalog_key = os.environ.get('CATALOG_KEY', 'products.json')
     cloudfront_url = get_ssm_parameter(os.environ['CLOUDFRONT_URL_PARAM'])
     app_url = get_ssm_parameter(os.environ['APP_URL_PARAM'])
 
     logger.info(f"Handler started with bucket: {source_bucket}, prefix: {bucket_prefix}")
 
     try:
-        response = s3.get_object(Bucket=source_bucket, Key='products.json')
-        products = json.loads(response['Body'].read().decode('utf-8'))
-        logger.info(f"Successfully read products.json. Found {len(products)} products.")
+        # Products are parsed one at a time while they are uploaded, so memory does not grow with the catalog size
+        response = s3.get_object(Bucket=source_bucket, Key=catalog_key)
+        products = catalog_reader.iter_products(response['Body'], catalog_key)
+
+        # Invoke with {"fullSync": true} to rewrite every product document regardless of the manifest
+        full_sync = bool(event.get('fullSync'))
+        previous_manifest = catalog_manifest.load_manifest(s3, source_bucket, layout_manifest_keys[document_layout])
+        renderer = DocumentRenderer(cloudfront_url, app_url)
+        if document_layout == 'sharded':
+            documents = render_shard_documents(renderer, bucket_prefix, products)
+        else:
+            documents = render_product_documents(renderer, bucket_prefix, products)
+        upload_result, manifest, changes = upload_product_files(source_bucket, renderer, bucket_prefix, documents, previous_manifest, full_sync)
+
+        # Documents of the other layout must leave the index, which a full ingestion job takes care of
+        layout_removed = sum(remove_layout(source_bucket, bucket_prefix, key) for layout, key in layout_manifest_keys.items() if layout != document_layout)
+
+        if any(changes.values()) or layout_removed:
+            changed_keys = [get_document_keys(bucket_prefix, document_id)[0] for document_id in changes['added'] + changes['changed']]
+            removed_keys = [get_document_keys(bucket_prefix, document_id)[0] for document_id in changes['removed']]
+            ingestion_result = kb_ingestion.sync_knowledge_base(bedrock_agent, knowledge_base_id, data_source_id, source_bucket, changed_keys, removed_keys,
+                                                                0 if layout_removed else direct_ingestion_max_documents)
+        else:
+            logger.info("Product catalog is unchanged. Skipping ingestion job.")
+            ingestion_result = {"message": "Ingestion job skipped, no catalog changes"}
+
+        # Save the manifest last so a failed run is retried on the next sync
+        catalog_manifest.save_manifest(s3, source_bucket, layout_manifest_keys[document_layout], manifest)
 
-        upload_result = upload_product_files(source_bucket, cloudfront_url, app_url, bucket_prefix, products)
-        
-        ingestion_result = start_knowledge_base_ingestion(knowledge_base_id, data_source_id)
+        if wait_for_ingestion and ingestion_result.get('mode') == 'ingestion_job':
+            timeout_seconds = context.get_remaining_time_in_millis() / 1000 - ingestion_wait_margin_seconds
+            ingestion_result['job'] = track_ingestion_job(knowledge_base_id, data_source_id, ingestion_result['jobId'], timeout_seconds)
 
         return {
             'statusCode': 200,
@@ -0,0 +1,179 @@
+import json
+import time
+import logging
+
+logger = logging.getLogger()
+
+INGESTION_JOB_TERMINAL_STATUSES = ('COMPLETE', 'FAILED', 'STOPPED')
+METRICS_NAMESPACE = 'RetailShoppingAgent/KnowledgeBaseIngestion'
+# Statistics reported by GetIngestionJob and the metric names they are published under
+INGESTION_JOB_METRICS = {
+    "numberOfDocumentsScanned": "DocumentsScanned",
+    "numberOfMetadataDocumentsScanned": "MetadataDocumentsScanned",
+    "numberOfNewDocumentsIndexed": "NewDocumentsIndexed",
+    "numberOfModifiedDocumentsIndexed": "ModifiedDocumentsIndexed",
+    "numberOfMetadataDocumentsModified": "MetadataDocumentsModified",
+    "numberOfDocumentsDeleted": "DocumentsDeleted",
+    "numberOfDocumentsFailed": "DocumentsFailed",
+    "numberOfDocumentsSkipped": "DocumentsSkipped"
+}
+
+# IngestKnowledgeBaseDocuments and DeleteKnowledgeBaseDocuments accept at most 10 documents per request
+DIRECT_INGESTION_BATCH_SIZE = 10
+DIRECT_INGESTION_FAILED_STATUSES = ('FAILED', 'METADATA_UPDATE_FAILED')
+
+def start_knowledge_base_ingestion(bedrock_agent, knowledge_base_id, data_source_id):
+    if not knowledge_base_id or not data_source_id:
+        logger.warning("Knowledge base ID or data source ID is missing. Skipping ingestion job.")
+        return {"message": "Ingestion job not started due to missing IDs"}
+
+    logger.info(f"Starting ingestion job for knowledge base ID: {knowledge_base_id} and data source ID: {data_source_id}")
+    response = bedrock_agent.start_ingestion_job(
+        knowledgeBaseId=knowledge_base_id,
+        dataSourceId=data_source_id
+    )
+
+    ingestion_job = response.get('ingestionJob', {})
+
+    logger.info(f"Ingestion job started successfully. Job ID: {ingestion_job.get('ingestionJobId', 'N/A')}, Job Status: {ingestion_job.get('status', 'N/A')}")
+    return {"message": "Ingestion job started successfully", "mode": "ingestion_job", "jobId": ingestion_job.get('ingestionJobId', 'N/A')}
+
+def get_failed_documents(response):
+    return [
+        detail['identifier']['s3']['uri'] for detail in response.get('documentDetails', [])
+        if detail['status'] in DIRECT_INGESTION_FAILED_STATUSES
+    ]
+
+def ingest_documents(bedrock_agent, knowledge_base_id, data_source_id, bucket, document_keys):
+    """Push S3 documents and their .metadata.json files straight into the knowledge base. Returns the URIs that failed."""
+    failed = []
+    for i in range(0, len(document_keys), DIRECT_INGESTION_BATCH_SIZE):
+        documents = [
+            {
+                "content": {
+                    "dataSourceType": "S3",
+                    "s3": {"s3Location": {"uri": f"s3://{bucket}/{key}"}}
+                },
+                "metadata": {
+                    "type": "S3_LOCATION",
+                    "s3Location": {"uri": f"s3://{bucket}/{key}.metadata.json"}
+                }
+            }
+            for key in document_keys[i:i + DIRECT_INGESTION_BATCH_SIZE]
+        ]
+        response = bedrock_agent.ingest_knowledge_base_documents(
+            knowledgeBaseId=knowledge_base_id,
+            dataSourceId=data_source_id,
+            documents=documents
+        )
+        failed.extend(get_failed_documents(response))
+    return failed
+
+def delete_documents(bedrock_agent, knowledge_base_id, data_source_id, bucket, document_keys):
+    """Remove S3 documents from the knowledge base index. Returns the URIs that failed."""
+    failed = []
+    for i in range(0, len(document_keys), DIRECT_INGESTION_BATCH_SIZE):
+        response = bedrock_agent.delete_knowledge_base_documents(
+            knowledgeBaseId=knowledge_base_id,
+            dataSourceId=data_source_id,
+            documentIdentifiers=[
+                {"dataSourceType": "S3", "s3": {"uri": f"s3://{bucket}/{key}"}}
+                for key in document_keys[i:i + DIRECT_INGESTION_BATCH_SIZE]
+            ]
+        )
+        failed.extend(get_failed_documents(response))
+    return failed
+
+def sync_knowledge_base(bedrock_agent, knowledge_base_id, data_source_id, bucket, changed_keys, removed_keys, max_direct_documents):
+    """Apply a catalog delta to the knowledge base.
+
+    Small deltas are pushed through the direct document ingest and delete APIs, which make
+    the documents searchable in seconds. Larger deltas, or a direct ingestion that fails,
+    fall back to a full data source ingestion job.
+    """
+    document_count = len(changed_keys) + len(removed_keys)
+    if not knowledge_base_id or not data_source_id or document_count > max_direct_documents:
+        return start_knowledge_base_ingestion(bedrock_agent, knowledge_base_id, data_source_id)
+
+    if not hasattr(bedrock_agent, 'ingest_knowledge_base_documents'):
+        logger.warning("This boto3 version does not support direct document ingestion. Starting an ingestion job instead.")
+        return start_knowledge_base_ingestion(bedrock_agent, knowledge_base_id, data_source_id)
+
+    logger.info(f"Ingesting {len(changed_keys)} changed and deleting {len(removed_keys)} removed documents directly")
+    try:
+        failed = ingest_documents(bedrock_agent, knowledge_base_id, data_source_id, bucket, changed_keys)
+        failed += delete_documents(bedrock_agent, knowledge_base_id, data_source_id, bucket, removed_keys)
+    except Exception as e:
+        logger.error(f"Direct document ingestion failed: {e}. Starting an ingestion job instead.")
+        return start_knowledge_base_ingestion(bedrock_agent, knowledge_base_id, data_source_id)
+
+    if failed:
+        logger.error(f"Direct ingestion failed for {len(failed)} documents, first failures: {failed[:10]}. Starting an ingestion job instead.")
+        return start_knowledge_base_ingestion(bedrock_agent, knowledge_base_id, data_source_id)
+
+    return {"message": "Documents ingested directly", "mode": "direct", "ingested": len(changed_keys), "deleted": len(removed_keys)}
+
+def get_ingestion_job(bedrock_agent, knowledge_base_id, data_source_id, ingestion_job_id):
+    response = bedrock_agent.get_ingestion_job(
+        knowledgeBaseId=knowledge_base_id,
+        dataSourceId=data_source_id,
+        ingestionJobId=ingestion_job_id
+    )
+    return response['ingestionJob']
+
+def wait_for_ingestion_job(bedrock_agent, knowledge_base_id, data_source_id, ingestion_job_id, timeout_seconds, initial_delay=2, max_delay=30):
+    """Poll the ingestion job with exponential backoff until it reaches a terminal status or the timeout runs out."""
+    deadline = time.monotonic() + timeout_seconds
+    delay = initial_delay
+    while True:
+        job = get_ingestion_job(bedrock_agent, knowledge_base_id, data_source_id, ingestion_job_id)
+        if job['status'] in INGESTION_JOB_TERMINAL_STATUSES:
+            return job
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.warning(f"Ingestion job {ingestion_job_id} is still {job['status']} after waiting {timeout_seconds:.0f}s")
+            return job
+
+        logger.info(f"Ingestion job {ingestion_job_id} is {job['status']}, checking again in {min(delay, remaining):.0f}s")
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, max_delay)
+
+def get_ingestion_job_summary(job):
+    """Status, statistics and service-side wall time of an ingestion job, as returned to callers."""
+    summary = {
+        "jobId": job['ingestionJobId'],
+        "status": job['status'],
+        "done": job['status'] in INGESTION_JOB_TERMINAL_STATUSES,
+        "statistics": job.get('statistics', {}),
+        "failureReasons": job.get('failureReasons', [])
+    }
+    if summary['done'] and job.get('startedAt') and job.get('updatedAt'):
+        summary['wallTimeSeconds'] = round((job['updatedAt'] - job['startedAt']).total_seconds(), 1)
+    return summary
+
+def emit_ingestion_metrics(knowledge_base_id, summary):
+    """Write the job statistics and wall time as a CloudWatch Embedded Metric Format log line."""
+    metrics = [{"Name": name, "Unit": "Count"} for name in INGESTION_JOB_METRICS.values()]
+    record = {
+        "KnowledgeBaseId": knowledge_base_id,
+        "Status": summary['status'],
+        "IngestionJobId": summary['jobId'],
+        "IngestionJobs": 1
+    }
+    metrics.append({"Name": "IngestionJobs", "Unit": "Count"})
+    for statistic, name in INGESTION_JOB_METRICS.items():
+        record[name] = summary['statistics'].get(statistic, 0)
+    if 'wallTimeSeconds' in summary:
+        record['WallTime'] = summary['wallTimeSeconds']
+        metrics.append({"Name": "WallTime", "Unit": "Seconds"})
+
+    record["_aws"] = {
+        "Timestamp": int(time.time() * 1000),
+        "CloudWatchMetrics": [{
+            "Namespace": METRICS_NAMESPACE,
+            "Dimensions": [["KnowledgeBaseId", "Status"]],
+            "Metrics": metrics
+        }]
+    }
+    print(json.dumps(record))
@@ -0,0 +1,145 @@
+# In-memory stand-ins for the AWS clients used by the catalog sync, for local runs and tests
+import io
+import time
+import uuid
+import threading
+from datetime import datetime, timezone
+
+class FakeBedrockAgentClient:
+    """Mimics the bedrock-agent knowledge base ingestion APIs and records every call."""
+
+    def __init__(self, fail_uris=()):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.documents = {}
+        self.ingestion_jobs = {}
+        self.fail_uris = set(fail_uris)
+
+    def record(self, operation, **kwargs):
+        with self.lock:
+            self.calls.append((operation, kwargs))
+
+    def start_ingestion_job(self, knowledgeBaseId, dataSourceId, **kwargs):
+        self.record('start_ingestion_job', knowledgeBaseId=knowledgeBaseId, dataSourceId=dataSourceId)
+        job = {
+            "knowledgeBaseId": knowledgeBaseId,
+            "dataSourceId": dataSourceId,
+            "ingestionJobId": uuid.uuid4().hex[:10].upper(),
+            "status": "STARTING",
+            "startedAt": datetime.now(timezone.utc),
+            "updatedAt": datetime.now(timezone.utc)
+        }
+        self.ingestion_jobs[job['ingestionJobId']] = job
+        return {"ingestionJob": dict(job)}
+
+    def get_ingestion_job(self, knowledgeBaseId, dataSourceId, ingestionJobId):
+        """Each call advances the job one status: STARTING, IN_PROGRESS, then COMPLETE."""
+        self.record('get_ingestion_job', knowledgeBaseId=knowledgeBaseId, dataSourceId=dataSourceId, ingestionJobId=ingestionJobId)
+        job = self.ingestion_jobs[ingestionJobId]
+        job['status'] = {"STARTING": "IN_PROGRESS", "IN_PROGRESS": "COMPLETE"}.get(job['status'], job['status'])
+        job['updatedAt'] = datetime.now(timezone.utc)
+        if job['status'] == 'COMPLETE':
+            job['statistics'] = {
+                "numberOfDocumentsScanned": len(self.documents),
+                "numberOfNewDocumentsIndexed": len(self.documents),
+                "numberOfDocumentsFailed": 0
+            }
+        return {"ingestionJob": dict(job)}
+
+    def document_details(self, knowledge_base_id, data_source_id, uri, status):
+        if uri in self.fail_uris:
+            status = 'FAILED'
+        return {
+            "knowledgeBaseId": knowledge_base_id,
+            "dataSourceId": data_source_id,
+            "status": status,
+            "identifier": {"dataSourceType": "S3", "s3": {"uri": uri}}
+        }
+
+    def ingest_knowledge_base_documents(self, knowledgeBaseId, dataSourceId, documents, **kwargs):
+        if not 1 <= len(documents) <= 10:
+            raise ValueError("documents must contain between 1 and 10 items")
+        self.record('ingest_knowledge_base_documents', knowledgeBaseId=knowledgeBaseId, dataSourceId=dataSourceId, documents=documents)
+
+        details = []
+        for document in documents:
+            uri = document['content']['s3']['s3Location']['uri']
+            self.documents[uri] = document
+            details.append(self.document_details(knowledgeBaseId, dataSourceId, uri, 'STARTING'))
+        return {"documentDetails": details}
+
+    def delete_knowledge_base_documents(self, knowledgeBaseId, dataSourceId, documentIdentifiers, **kwargs):
+        if not 1 <= len(documentIdentifiers) <= 10:
+            raise ValueError("documentIdentifiers must contain between 1 and 10 items")
+        self.record('delete_knowledge_base_documents', knowledgeBaseId=knowledgeBaseId, dataSourceId=dataSourceId, documentIdentifiers=documentIdentifiers)
+
+        details = []
+        for identifier in documentIdentifiers:
+            uri = identifier['s3']['uri']
+            self.documents.pop(uri, None)
+            details.append(self.document_details(knowledgeBaseId, dataSourceId, uri, 'DELETING'))
+        return {"documentDetails": details}
+
+class LocalStreamingBody:
+    def __init__(self, data):
+        self.stream = io.BytesIO(data)
+
+    def read(self, amt=None):
+        return self.stream.read(amt)
+
+    def iter_lines(self):
+        for line in self.stream:
+            yield line.rstrip(b'\r\n')
+
+class LocalS3Client:
+    """In-memory S3 bucket store that adds a fixed latency to every request to model per-object overhead."""
+
+    def __init__(self, latency_ms=0):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.latency = latency_ms / 1000
+        self.request_count = 0
+
+    def request(self):
+        with self.lock:
+            self.request_count += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.request()
+        with self.lock:
+            self.buckets.setdefault(Bucket, {})[Key] = Body.encode('utf-8') if isinstance(Body, str) else bytes(Body)
+        return {}
+
+    def get_object(self, Bucket, Key, **kwargs):
+        self.request()
+        data = self.buckets.get(Bucket, {}).get(Key)
+        if data is None:
+            raise self.exceptions.NoSuchKey(f"No such key: {Key}")
+        return {"Body": LocalStreamingBody(data), "ContentLength": len(data)}
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, MaxKeys=1000, **kwargs):
+        self.request()
+        keys = sorted(key for key in self.buckets.get(Bucket, {}) if key.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+        response = {
+            "Contents": [{"Key": key, "Size": len(self.buckets[Bucket][key])} for key in page],
+            "KeyCount": len(page),
+            "IsTruncated": start + MaxKeys < len(keys)
+        }
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + MaxKeys)
+        return response
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        self.request()
+        with self.lock:
+            for item in Delete['Objects']:
+                self.buckets.get(Bucket, {}).pop(item['Key'], None)
+        return {}
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
@@ -0,0 +1,85 @@
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger()
+
+class ConcurrentUploader:
+    """Uploads objects to S3 over a bounded thread pool.
+
+    Objects are consumed lazily from any iterable of (key, body) pairs and at most
+    twice the pool size are held in memory at a time. Throttling (SlowDown) is retried
+    with backoff by the botocore retry configuration of the client passed in.
+
+    Subclasses change how an object is written by overriding send, and what each
+    upload records by overriding put_object and get_stats.
+    """
+
+    def __init__(self, s3_client, bucket, max_workers=32, progress_interval=500):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.max_workers = max_workers
+        self.progress_interval = progress_interval
+        self.lock = threading.Lock()
+        self.uploaded = 0
+        self.failed_keys = []
+        self.stopped = False
+        self.start_time = None
+
+    def send(self, key, body):
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=body)
+
+    def put_object(self, key, body):
+        """Send one object, counting it as uploaded or failed. Returns True when it was uploaded."""
+        try:
+            self.send(key, body)
+        except Exception as e:
+            logger.error(f"Failed to upload {key}: {e}")
+            with self.lock:
+                self.failed_keys.append(key)
+            return False
+
+        with self.lock:
+            self.uploaded += 1
+            uploaded = self.uploaded
+        if uploaded % self.progress_interval == 0:
+            elapsed = time.perf_counter() - self.start_time
+            logger.info(f"Uploaded {uploaded} objects in {elapsed:.1f}s ({uploaded / elapsed:.0f} objects/s)")
+        return True
+
+    def get_stats(self, elapsed):
+        return {
+            "uploaded": self.uploaded,
+            "failed": len(self.failed_keys),
+            "seconds": round(elapsed, 2),
+            "objects_per_second": round(self.uploaded / elapsed, 1) if elapsed > 0 else None,
+            "concurrency": self.max_workers
+        }
+
+    def upload_all(self, objects, should_stop=None):
+        """Upload every (key, body) pair and return upload statistics.
+
+        should_stop is checked before each object. Once it returns True the remaining
+        objects are left for a later run and stopped is set.
+        """
+        self.start_time = time.perf_counter()
+        in_flight = threading.BoundedSemaphore(self.max_workers * 2)
+
+        def upload(key, body):
+            try:
+                self.put_object(key, body)
+            finally:
+                in_flight.release()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for key, body in objects:
+                if should_stop and should_stop():
+                    self.stopped = True
+                    break
+                in_flight.acquire()
+                executor.submit(upload, key, body)
+
+        stats = self.get_stats(time.perf_counter() - self.start_time)
+        logger.info(f"Upload finished: {stats}")
+        return stats
@@ -0,0 +1,57 @@
+import json
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger()
+
+def hash_image(data):
+    return hashlib.sha256(data).hexdigest()
+
+class ImageManifest:
+    """Key, size and content hash of every image uploaded so far, stored as a JSON object in S3.
+
+    Entries are only recorded after a successful upload, so a checkpoint saved part way
+    through a sync lists exactly the images a re-invocation can skip.
+    """
+
+    def __init__(self, s3_client, bucket, key):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.lock = threading.Lock()
+        self.images = self.load()
+        self.dirty = False
+
+    def load(self):
+        try:
+            response = self.s3.get_object(Bucket=self.bucket, Key=self.key)
+        except self.s3.exceptions.NoSuchKey:
+            logger.info(f"No image manifest found at s3://{self.bucket}/{self.key}. Uploading all images.")
+            return {}
+
+        manifest = json.loads(response['Body'].read().decode('utf-8'))
+        logger.info(f"Loaded image manifest with {len(manifest['images'])} images from s3://{self.bucket}/{self.key}")
+        return manifest['images']
+
+    def matches(self, key, size, digest, variants=None):
+        """True when the image was uploaded with the same content and the same set of variant sizes."""
+        entry = self.images.get(key)
+        return (entry is not None and entry['size'] == size and entry['sha256'] == digest
+                and entry.get('variants', {}) == (variants or {}))
+
+    def record(self, key, size, digest, variants=None):
+        with self.lock:
+            self.images[key] = {"size": size, "sha256": digest, "variants": variants or {}}
+            self.dirty = True
+
+    def save(self):
+        """Write the manifest if images were recorded since the last save."""
+        with self.lock:
+            if not self.dirty:
+                return
+            body = json.dumps({"version": 1, "images": self.images}, separators=(',', ':'))
+            count = len(self.images)
+            self.dirty = False
+        self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=body, ContentType='application/json')
+        logger.info(f"Saved image manifest checkpoint with {count} images to s3://{self.bucket}/{self.key}")
@@ -0,0 +1,101 @@
+import io
+import os
+import sys
+import time
+import mimetypes
+from boto3.s3.transfer import TransferConfig
+from image_manifest import hash_image
+from image_variants import get_variant_key, make_variants
+
+# s3_uploader.py is copied next to this file at synth. Local runs import it from the catalog upload Lambda
+try:
+    from s3_uploader import ConcurrentUploader
+except ImportError:
+    sys.path.append(os.path.join(os.path.dirname(__file__), "..", "upload_product_catalog_and_sync_kb"))
+    from s3_uploader import ConcurrentUploader
+
+# Members above this size are sent as a multipart upload
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+
+class ImageUploader(ConcurrentUploader):
+    """ConcurrentUploader for images read from a streamed archive.
+
+    Objects larger than the multipart threshold go through upload_fileobj, which splits
+    them into parts uploaded in parallel.
+
+    With a manifest, images whose size and hash match the manifest are skipped and every
+    upload is recorded in it. The manifest is checkpointed every checkpoint_interval seconds.
+
+    variants maps variant names to a maximum width and height. Each uploaded image is also
+    resized to every variant in its worker thread and stored under images/<variant>/.
+    """
+
+    def __init__(self, s3_client, bucket, max_workers=32, progress_interval=500, manifest=None, checkpoint_interval=30, variants=None):
+        super().__init__(s3_client, bucket, max_workers, progress_interval)
+        self.manifest = manifest
+        self.checkpoint_interval = checkpoint_interval
+        self.variants = variants or {}
+        self.transfer_config = TransferConfig(
+            multipart_threshold=MULTIPART_THRESHOLD,
+            multipart_chunksize=MULTIPART_CHUNK_SIZE,
+            max_concurrency=4
+        )
+        self.skipped = 0
+        self.uploaded_bytes = 0
+        self.multipart = 0
+        self.variants_uploaded = 0
+
+    def send(self, key, data):
+        content_type = mimetypes.guess_type(key)[0] or 'application/octet-stream'
+        if len(data) > MULTIPART_THRESHOLD:
+            self.s3.upload_fileobj(io.BytesIO(data), self.bucket, key, ExtraArgs={'ContentType': content_type}, Config=self.transfer_config)
+        else:
+            self.s3.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=content_type)
+
+        for variant_name, variant_data in make_variants(data, self.variants) if self.variants else ():
+            self.s3.put_object(Bucket=self.bucket, Key=get_variant_key(key, variant_name), Body=variant_data, ContentType='image/jpeg')
+
+    def put_object(self, key, data):
+        if self.manifest is not None:
+            digest = hash_image(data)
+            if self.manifest.matches(key, len(data), digest, self.variants):
+                with self.lock:
+                    self.skipped += 1
+                return False
+
+        if not super().put_object(key, data):
+            return False
+        if self.manifest is not None:
+            self.manifest.record(key, len(data), digest, self.variants)
+        with self.lock:
+            self.uploaded_bytes += len(data)
+            self.multipart += len(data) > MULTIPART_THRESHOLD
+            self.variants_uploaded += len(self.variants)
+        return True
+
+    def checkpointed(self, objects):
+        """Pass the objects through, saving the manifest every checkpoint_interval seconds."""
+        last_checkpoint = time.perf_counter()
+        for item in objects:
+            yield item
+            if time.perf_counter() - last_checkpoint > self.checkpoint_interval:
+                self.manifest.save()
+                last_checkpoint = time.perf_counter()
+
+    def upload_all(self, objects, should_stop=None):
+        return super().upload_all(self.checkpointed(objects) if self.manifest is not None else objects, should_stop)
+
+    def get_stats(self, elapsed):
+        return {
+            "uploaded": self.uploaded,
+            "skipped": self.skipped,
+            "failed": len(self.failed_keys),
+            "stopped": self.stopped,
+            "multipart": self.multipart,
+            "variants": self.variants_uploaded,
+            "megabytes": round(self.uploaded_bytes / (1024 * 1024), 1),
+            "seconds": round(elapsed, 2),
+            "images_per_second": round(self.uploaded / elapsed, 1) if elapsed > 0 else None,
+            "concurrency": self.max_workers
+        }
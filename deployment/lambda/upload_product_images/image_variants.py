@@ -0,0 +1,37 @@
+import io
+from PIL import Image
+
+VARIANT_QUALITY = 80
+
+def parse_variants(value):
+    """Parse "thumb:200,medium:400" into {"thumb": 200, "medium": 400}."""
+    variants = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, size = item.split(':')
+        variants[name.strip()] = int(size)
+    return variants
+
+def get_variant_key(key, variant_name):
+    """images/<file> is stored as images/<variant_name>/<file>."""
+    prefix, _, file_name = key.rpartition('/')
+    return f"{prefix}/{variant_name}/{file_name}" if prefix else f"{variant_name}/{file_name}"
+
+def make_variants(data, variants):
+    """Return (variant_name, jpeg_bytes) pairs with the image fitted within each variant's size.
+
+    Variants are encoded as JPEG so they keep the file name, and content type, of the
+    original .jpg images. Images smaller than a variant are not upscaled.
+    """
+    results = []
+    with Image.open(io.BytesIO(data)) as image:
+        largest = max(variants.values())
+        # Let the JPEG decoder downscale while decoding, which is much faster than a full decode
+        image.draft('RGB', (largest, largest))
+        image = image.convert('RGB')
+        for name, size in sorted(variants.items(), key=lambda item: -item[1]):
+            variant = image.copy()
+            variant.thumbnail((size, size), Image.Resampling.LANCZOS)
+            output = io.BytesIO()
+            variant.save(output, format='JPEG', quality=VARIANT_QUALITY, optimize=True, progressive=True)
+            results.append((name, output.getvalue()))
+    return results
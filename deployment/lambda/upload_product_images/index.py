@@ -1,50 +1,114 @@
 import boto3
 import os
+import json
+import time
 import tarfile
 import logging
 import urllib.request
+from botocore.config import Config
+from image_uploader import ImageUploader
+from image_manifest import ImageManifest
+from image_variants import parse_variants
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+# Parallel image uploads, with one pooled connection each. Throttled uploads are retried by the adaptive retry mode
+upload_concurrency = int(os.environ.get('UPLOAD_CONCURRENCY', '32'))
+s3 = boto3.client('s3', config=Config(
+    max_pool_connections=upload_concurrency,
+    retries={'max_attempts': 10, 'mode': 'adaptive'}
+))
+lambda_client = boto3.client('lambda')
+download_timeout_seconds = 60
+# Stop taking new images this long before the invocation times out, to checkpoint and hand over
+stop_margin_seconds = 30
+# Re-invoke the function asynchronously to resume an interrupted sync, at most this many times in a row
+max_reinvocations = int(os.environ.get('MAX_REINVOCATIONS', '5'))
+# Resized copies generated for every image, stored under images/<name>/. Empty to disable
+image_variants = parse_variants(os.environ.get('IMAGE_VARIANTS', 'thumb:200,medium:400'))
+METRICS_NAMESPACE = 'RetailShoppingAgent/ProductImages'
+
+def iter_archive_images(fileobj):
+    """Yield (key, data) for every file in a gzipped tar stream, reading the stream once from start to end."""
+    with tarfile.open(fileobj=fileobj, mode='r|gz') as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            # Stream mode only allows reading a member before moving on to the next one
+            data = tar.extractfile(member).read()
+            yield f"images/{os.path.basename(member.name)}", data
+
+def emit_sync_metrics(bucket_name, stats):
+    """Write the image sync counters as a CloudWatch Embedded Metric Format log line."""
+    print(json.dumps({
+        "Bucket": bucket_name,
+        "ImagesUploaded": stats['uploaded'],
+        "ImagesSkipped": stats['skipped'],
+        "ImagesFailed": stats['failed'],
+        "SyncSeconds": stats['seconds'],
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [["Bucket"]],
+                "Metrics": [
+                    {"Name": "ImagesUploaded", "Unit": "Count"},
+                    {"Name": "ImagesSkipped", "Unit": "Count"},
+                    {"Name": "ImagesFailed", "Unit": "Count"},
+                    {"Name": "SyncSeconds", "Unit": "Seconds"}
+                ]
+            }]
+        }
+    }))
+
+def reinvoke(context, attempt):
+    logger.info(f"Re-invoking {context.function_name} to resume the image sync (attempt {attempt})")
+    lambda_client.invoke(
+        FunctionName=context.function_name,
+        InvocationType='Event',
+        Payload=json.dumps({"resume": True, "attempt": attempt})
+    )
+
 def handler(event, context):
-    s3 = boto3.client('s3')
     bucket_name = os.environ['BUCKET_NAME']
     images_url = os.environ['IMAGES_URL']
+    # The stack denies CloudFront access to manifests/, so the manifest is not served with the images
+    manifest_key = os.environ.get('MANIFEST_KEY', 'manifests/images.json')
+    attempt = event.get('attempt', 0)
 
     try:
-        # Download the tar.gz file to /tmp
-        logger.info(f"Downloading images from {images_url}")
-        filename, _ = urllib.request.urlretrieve(images_url, '/tmp/images.tar.gz')
-        logger.info(f"Filename: {filename}")
-        
-        # Extract files to /tmp directory
-        extract_path = '/tmp/extracted_images'
-        os.makedirs(extract_path, exist_ok=True)
-        
-        logger.info("Extracting files")
-        with tarfile.open('/tmp/images.tar.gz') as tar:
-            tar.extractall(path=extract_path)
-        
-        os.remove('/tmp/images.tar.gz')
-
-        # Upload image files to S3
-        logger.info("Uploading files to S3")
-        for root, _, files in os.walk(extract_path):
-            for file_name in files:
-                file_path = os.path.join(root, file_name)
-                s3_key = f"images/{file_name}"
-                with open(file_path, 'rb') as file_data:
-                    s3.put_object(
-                        Bucket=bucket_name,
-                        Key=s3_key,
-                        Body=file_data
-                    )
-                    # logger.info(f"Uploaded {s3_key}")
+        # Images are read from the HTTP response and uploaded as they are decompressed, without touching /tmp.
+        # Images already in the manifest with the same size and hash are skipped, so a re-run resumes where the last one stopped
+        logger.info(f"Streaming images from {images_url} to bucket {bucket_name} with {upload_concurrency} parallel uploads")
+        manifest = ImageManifest(s3, bucket_name, manifest_key)
+        uploader = ImageUploader(s3, bucket_name, max_workers=upload_concurrency, manifest=manifest, variants=image_variants)
+
+        def should_stop():
+            return context is not None and context.get_remaining_time_in_millis() < stop_margin_seconds * 1000
+
+        try:
+            with urllib.request.urlopen(images_url, timeout=download_timeout_seconds) as response:
+                stats = uploader.upload_all(iter_archive_images(response), should_stop)
+        finally:
+            manifest.save()
+        emit_sync_metrics(bucket_name, stats)
+
+        if stats['stopped']:
+            if attempt >= max_reinvocations:
+                raise RuntimeError(f"Image sync is still incomplete after {attempt} re-invocations")
+            reinvoke(context, attempt + 1)
+            return {
+                'statusCode': 202,
+                'body': f'Image sync checkpointed and resumed in a new invocation: {stats}'
+            }
+
+        if stats['failed']:
+            raise RuntimeError(f"Failed to upload {stats['failed']} images, first failures: {uploader.failed_keys[:10]}")
 
         return {
             'statusCode': 200,
-            'body': 'Images uploaded successfully'
+            'body': f'Images uploaded successfully: {stats}'
         }
     except Exception as e:
         logger.error(f"Error: {str(e)}")
@@ -0,0 +1,72 @@
+# In-memory S3 and a local HTTP server for running the image upload against local data
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class LocalS3Client:
+    """In-memory stand-in for the S3 client calls made by the image upload."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.objects = {}
+        self.calls = []
+
+    def store(self, operation, bucket, key, data, content_type):
+        with self.lock:
+            self.calls.append((operation, key))
+            self.objects[(bucket, key)] = {"Body": data, "ContentType": content_type}
+
+    def put_object(self, Bucket, Key, Body, ContentType='binary/octet-stream', **kwargs):
+        if hasattr(Body, 'read'):
+            Body = Body.read()
+        self.store('put_object', Bucket, Key, Body.encode('utf-8') if isinstance(Body, str) else bytes(Body), ContentType)
+        return {}
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Config=None, **kwargs):
+        self.store('upload_fileobj', Bucket, Key, Fileobj.read(), (ExtraArgs or {}).get('ContentType', 'binary/octet-stream'))
+
+    def get_object(self, Bucket, Key, **kwargs):
+        item = self.objects.get((Bucket, Key))
+        if item is None:
+            raise self.exceptions.NoSuchKey(f"No such key: {Key}")
+        return {"Body": io.BytesIO(item['Body']), "ContentLength": len(item['Body']), "ContentType": item['ContentType']}
+
+    class exceptions:
+        class NoSuchKey(Exception):
+            pass
+
+class LocalFileServer:
+    """Serves a single payload over HTTP on localhost from a background thread.
+
+        with LocalFileServer(archive_bytes) as url:
+            os.environ['IMAGES_URL'] = url
+    """
+
+    def __init__(self, payload, path='/images.tar.gz'):
+        payload_path = path
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != payload_path:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/gzip')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}{path}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self.url
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
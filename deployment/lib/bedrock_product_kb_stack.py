@@ -8,6 +8,7 @@ from aws_cdk import (
     aws_lambda as lambda_,
     aws_bedrock as bedrock,
     aws_ssm as ssm,     
+    aws_s3 as s3,
     aws_logs as logs,
     aws_cloudwatch as cloudwatch,
     custom_resources as cr,
@@ -25,6 +26,7 @@ class BedrockProductKnowledgeBaseStack(NestedStack):
         super().__init__(scope, construct_id, **kwargs)
 
         self.app_name= app_name
+        self.config = config
         self.unique_string = hashlib.sha256(f"{self.app_name}-{self.region}".encode(), usedforsecurity=False).hexdigest()[:8]
 
         # Vector Configurations for Knowledge Base and Amazon OpenSearch Serverless vector store
@@ -116,6 +118,7 @@ class BedrockProductKnowledgeBaseStack(NestedStack):
                 ),
                 type="S3"
             ),
+            vector_ingestion_configuration=self.create_shard_ingestion_configuration() if config.product_kb_document_layout == 'sharded' else None,
             data_deletion_policy= 'RETAIN'
         )
         self.data_source_id = product_catalog_data_source.attr_data_source_id
@@ -218,9 +221,16 @@ class BedrockProductKnowledgeBaseStack(NestedStack):
                 "VECTOR_FIELD": vector_field,
                 "TEXT_FIELD": text_field,
                 "METADATA_FIELD": metadata_field,
-                "VECTOR_DIMENSION": str(vector_dimension)
+                "VECTOR_DIMENSION": str(vector_dimension),
+                "INDEX_READY_TIMEOUT_SECONDS": "240", # Longest wait for the new index to serve queries
+                "INDEX_SPACE_TYPE": self.config.product_index_space_type,
+                "HNSW_M": str(self.config.product_index_hnsw_m),
+                "HNSW_EF_CONSTRUCTION": str(self.config.product_index_hnsw_ef_construction),
+                "HNSW_EF_SEARCH": str(self.config.product_index_hnsw_ef_search),
+                "INDEX_SHARDS": str(self.config.product_index_shards),
+                "INDEX_QUANTIZATION": self.config.product_index_quantization # none, fp16 or byte
             },
-            timeout=Duration.seconds(30)
+            timeout=Duration.minutes(5)
         )
 
  	    # Grant the Lambda function permissions to access OpenSearch
@@ -261,13 +271,61 @@ class BedrockProductKnowledgeBaseStack(NestedStack):
                     actions=["lambda:InvokeFunction"],
                     resources=[create_index_lambda.function_arn]
                 )
-            ])
+            ]),
+            timeout=Duration.minutes(6) # Outlasts the index Lambda, which waits for the index to be ready
         )
 
         create_index_cr.node.add_dependency(aoss_data_access_policy_lambda)
 
         return create_index_cr
     
+    def create_shard_ingestion_configuration(self):
+        """Ingest each shard file as one chunk and split it into one chunk per product with a POST_CHUNKING transformation Lambda."""
+        lambda_code_path = os.path.join(os.path.dirname(__file__), "..", "lambda", "split_product_shards")
+
+        # Intermediate storage the knowledge base and the transformation Lambda exchange content batches through
+        intermediate_bucket = s3.Bucket(
+            self, "ShardTransformationBucket",
+            removal_policy=RemovalPolicy.DESTROY,
+            auto_delete_objects=True,
+            enforce_ssl=True
+        )
+
+        split_shards_lambda = lambda_.Function(
+            self, "SplitProductShards",
+            function_name=f"{self.app_name}-split-product-shards",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            handler="index.handler",
+            code=lambda_.Code.from_asset(lambda_code_path),
+            memory_size=512,
+            timeout=Duration.minutes(5)
+        )
+        intermediate_bucket.grant_read_write(split_shards_lambda)
+
+        intermediate_bucket.grant_read_write(self.product_knowledge_base_role)
+        split_shards_lambda.grant_invoke(self.product_knowledge_base_role)
+
+        return bedrock.CfnDataSource.VectorIngestionConfigurationProperty(
+            chunking_configuration=bedrock.CfnDataSource.ChunkingConfigurationProperty(
+                chunking_strategy="NONE"
+            ),
+            custom_transformation_configuration=bedrock.CfnDataSource.CustomTransformationConfigurationProperty(
+                intermediate_storage=bedrock.CfnDataSource.IntermediateStorageProperty(
+                    s3_location=bedrock.CfnDataSource.S3LocationProperty(
+                        uri=f"s3://{intermediate_bucket.bucket_name}/"
+                    )
+                ),
+                transformations=[bedrock.CfnDataSource.TransformationProperty(
+                    step_to_apply="POST_CHUNKING",
+                    transformation_function=bedrock.CfnDataSource.TransformationFunctionProperty(
+                        transformation_lambda_configuration=bedrock.CfnDataSource.TransformationLambdaConfigurationProperty(
+                            lambda_arn=split_shards_lambda.function_arn
+                        )
+                    )
+                )]
+            )
+        )
+
     def setup_knowledge_base_logging(self, knowledge_base_name, knowledge_base_arn):
         # Create a CloudWatch log group for knowledge base logs
         log_group_name = f"/aws/bedrock/{knowledge_base_name}-logs"
@@ -1,11 +1,19 @@
 import os
+import json
+import shutil
 import hashlib
 import random
 import string
 from aws_cdk import (
     NestedStack,
     Duration,
+    RemovalPolicy,
+    Annotations,
+    BundlingOptions,
     aws_lambda as lambda_,
+    aws_dynamodb as dynamodb,
+    aws_sqs as sqs,
+    aws_lambda_event_sources as lambda_event_sources,
     aws_iam as iam,
     aws_ssm as ssm,
     aws_bedrock as bedrock,
@@ -41,6 +49,18 @@ class BedrockShoppingAgentStack(NestedStack):
             
         # Path to your lambda function code
         lambda_code_path = os.path.join(os.path.dirname(__file__), "..", "bedrock_agent", "shopping_agent", "action_groups" , "create_order_actions", "lambda")
+
+        # Copy the action group schema to the Lambda folder, the Lambda builds its action registry from it
+        shutil.copy2(
+            f"{shopping_agent_path}/action_groups/create_order_actions/api_schema/create_order_actions.openapi.json",
+            os.path.join(lambda_code_path, "create_order_actions.openapi.json")
+        )
+
+        # Write the product names and prices from the catalog snapshot to the Lambda folder, orders are priced from it
+        with open(os.path.join(os.path.dirname(__file__), "..", "data", "products.json")) as f:
+            catalog_prices = [{"id": product["id"], "name": product["name"], "price": product["price"]} for product in json.load(f)]
+        with open(os.path.join(lambda_code_path, "catalog_prices.json"), "w") as f:
+            json.dump(catalog_prices, f, separators=(',', ':'))
         # Create the IAM role for the Lambda function
         create_order_lambda_role = iam.Role(
             self, "CreateOrderLambdaRole",
@@ -64,6 +84,61 @@ class BedrockShoppingAgentStack(NestedStack):
             iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSLambdaBasicExecutionRole")
         )
 
+        # Orders table. Each order is an ORDER item with the order details plus one ITEM#<n> item per order item
+        orders_table = dynamodb.Table(
+            self, "OrdersTable",
+            table_name=f"{app_name}-orders",
+            partition_key=dynamodb.Attribute(name="orderId", type=dynamodb.AttributeType.STRING),
+            sort_key=dynamodb.Attribute(name="sk", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            point_in_time_recovery=True,
+            removal_policy=RemovalPolicy.DESTROY # RETAIN for production to avoid deletion of orders
+        )
+        orders_table.grant_read_write_data(create_order_lambda_role)
+
+        # Queue of order confirmation emails. Messages that fail to send 5 times are moved to the dead letter queue
+        email_dlq = sqs.Queue(
+            self, "OrderEmailDLQ",
+            queue_name=f"{app_name}-order-email-dlq",
+            retention_period=Duration.days(14),
+            enforce_ssl=True
+        )
+        email_queue = sqs.Queue(
+            self, "OrderEmailQueue",
+            queue_name=f"{app_name}-order-email",
+            visibility_timeout=Duration.seconds(180), # Six times the consumer timeout
+            dead_letter_queue=sqs.DeadLetterQueue(max_receive_count=5, queue=email_dlq),
+            enforce_ssl=True
+        )
+        email_queue.grant_send_messages(create_order_lambda_role)
+
+        # Consumer that renders and sends the queued emails in batches. It needs a verified SES sender, so it is
+        # only deployed when one is configured
+        if config.order_email_sender:
+            send_order_emails_lambda = lambda_.Function(
+                self, "SendOrderEmailsLambda",
+                function_name=f"{app_name}-send-order-emails",
+                runtime=lambda_.Runtime.PYTHON_3_12,
+                handler="index.handler",
+                code=lambda_.Code.from_asset(os.path.join(os.path.dirname(__file__), "..", "lambda", "send_order_emails")),
+                environment={
+                    "SENDER_EMAIL": config.order_email_sender
+                },
+                timeout=Duration.seconds(30)
+            )
+            send_order_emails_lambda.add_to_role_policy(iam.PolicyStatement(
+                actions=["ses:SendEmail"],
+                resources=[f"arn:aws:ses:{self.region}:{self.account}:identity/*"]
+            ))
+            send_order_emails_lambda.add_event_source(lambda_event_sources.SqsEventSource(
+                email_queue,
+                batch_size=10,
+                max_batching_window=Duration.seconds(5),
+                report_batch_item_failures=True
+            ))
+        else:
+            Annotations.of(self).add_warning("ORDER_EMAIL_SENDER is not set. The order email consumer is not deployed and confirmation emails are not sent")
+
         # Enable Lambda Extension Layer for reading SSM Parameter and Secrets from local cache
         params_and_secrets = lambda_.ParamsAndSecretsLayerVersion.from_version(lambda_.ParamsAndSecretsVersions.V1_0_103,
             cache_size=500,
@@ -77,10 +152,23 @@ class BedrockShoppingAgentStack(NestedStack):
             role= create_order_lambda_role,
             runtime=lambda_.Runtime.PYTHON_3_12,
             handler="index.handler",
-            code=lambda_.Code.from_asset(lambda_code_path),
+            # urllib3 is pinned in requirements.txt rather than taken from the runtime's botocore
+            code=lambda_.Code.from_asset(
+                lambda_code_path,
+                bundling=BundlingOptions(
+                    image=lambda_.Runtime.PYTHON_3_12.bundling_image,
+                    command=[
+                        "bash", "-c",
+                        "pip install --no-cache -r requirements.txt -t /asset-output && cp -rT . /asset-output"
+                    ]
+                ),
+            ),
             environment={
                 "API_URL_PARAM": config.product_service_url_param,
-                "API_KEY_SECRET_NAME": config.product_service_apikey_secret
+                "API_KEY_SECRET_NAME": config.product_service_apikey_secret,
+                "CONFIG_CACHE_TTL": "300", # Seconds before the cached API URL and key are refreshed in the background
+                "ORDERS_TABLE_NAME": orders_table.table_name,
+                "EMAIL_QUEUE_URL": email_queue.queue_url
             },
             params_and_secrets = params_and_secrets,
             timeout=Duration.seconds(30),
@@ -220,6 +308,8 @@ class BedrockShoppingAgentStack(NestedStack):
         CfnOutput(self, f"{config.bedrock_shopping_agent_name}-AgentId", value=agent.attr_agent_id, description="Bedrock Agent ID")
         CfnOutput(self, f"{config.bedrock_shopping_agent_name}-AgentAliasId", value=alias.attr_agent_alias_id, description="Bedrock Agent Alias ID")
         CfnOutput(self, f"{config.bedrock_shopping_agent_name}-AgentRoleArn", value=agent_role.role_arn, description="Bedrock Agent Role ARN")
+        CfnOutput(self, "OrdersTableName", value=orders_table.table_name, description="Orders DynamoDB Table Name")
+        CfnOutput(self, "OrderEmailDLQUrl", value=email_dlq.queue_url, description="Order Email Dead Letter Queue URL")
         CfnOutput(self, "CreateOrderLambdaArn", value=create_order_lambda.function_arn, description="Create Order Lambda ARN")
         # CfnOutput(self, "ModelInvocationBucketName", value=model_invocation_bucket.bucket_name, description="Model Invocation Bucket Name")
         # CfnOutput(self, "ModelLogGroupName", value=model_log_group.log_group_name, description="Model Log Group Name")
@@ -1,4 +1,5 @@
 import os
+import shutil
 import hashlib
 from aws_cdk import (
     Stack,
@@ -12,17 +13,17 @@ from aws_cdk import (
     RemovalPolicy,
     Duration,
     BundlingOptions,
-    Size,
     CfnOutput
 )
 from constructs import Construct
 
 class S3CloudFrontStack(Stack):
-    def __init__(self, scope: Construct, construct_id: str, app_name: str, cloudfront_url_param: str, **kwargs) -> None:
+    def __init__(self, scope: Construct, construct_id: str, app_name: str, cloudfront_url_param: str, image_variants: dict = None, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
         unique_string = hashlib.sha256(f"{app_name}-{self.region}-{self.account}".encode(), usedforsecurity=False).hexdigest()[:8]
         self.app_name= app_name
+        self.image_variants = image_variants or {}
 
         # Create S3 bucket
         self.bucket = s3.Bucket(
@@ -43,6 +44,14 @@ class S3CloudFrontStack(Stack):
         # Grant read permissions to CloudFront OAI
         self.bucket.grant_read(oai)
 
+        # Keep the image sync manifest private. The explicit deny overrides the read access CloudFront has to every object
+        self.bucket.add_to_resource_policy(iam.PolicyStatement(
+            effect=iam.Effect.DENY,
+            actions=["s3:GetObject"],
+            resources=[self.bucket.arn_for_objects("manifests/*")],
+            principals=[oai.grant_principal]
+        ))
+
         # Create logging bucket with ACLs enabled
         self.logs_bucket = s3.Bucket(
             self, 
@@ -92,19 +101,35 @@ class S3CloudFrontStack(Stack):
 
     def upload_product_images(self):
         self.lambda_code_path = os.path.join(os.path.dirname(__file__), "..", "lambda", "upload_product_images")
+
+        # Copy the concurrent uploader shared with the catalog upload Lambda, which ImageUploader extends
+        shutil.copy2(
+            os.path.join(os.path.dirname(__file__), "..", "lambda", "upload_product_catalog_and_sync_kb", "s3_uploader.py"),
+            os.path.join(self.lambda_code_path, "s3_uploader.py")
+        )
         upload_images_lambda = lambda_.Function(
             self,
             "UploadProductImages",
             function_name=f"{self.app_name}-upload-product-images",
             runtime=lambda_.Runtime.PYTHON_3_12,
             handler="index.handler",
-            ephemeral_storage_size=Size.mebibytes(2048),
             code=lambda_.Code.from_asset(
-                self.lambda_code_path
+                self.lambda_code_path,
+                bundling=BundlingOptions(
+                    image=lambda_.Runtime.PYTHON_3_12.bundling_image,
+                    command=[
+                        "bash", "-c",
+                        "pip install --no-cache -r requirements.txt -t /asset-output && cp -rT . /asset-output"
+                    ]
+                ),
             ),
             environment={
                 "BUCKET_NAME": self.bucket.bucket_name,
-                "IMAGES_URL": "https://code.retaildemostore.retail.aws.dev/images.tar.gz"
+                "IMAGES_URL": "https://code.retaildemostore.retail.aws.dev/images.tar.gz",
+                "UPLOAD_CONCURRENCY": "32", # The archive is streamed to S3 with this many parallel uploads, no ephemeral storage needed
+                "MANIFEST_KEY": "manifests/images.json", # Key, size and hash of uploaded images, used to skip unchanged images and resume. Not served by CloudFront
+                "MAX_REINVOCATIONS": "5", # An interrupted sync re-invokes itself to resume, at most this many times in a row
+                "IMAGE_VARIANTS": ",".join(f"{name}:{size}" for name, size in self.image_variants.items()) # Resized copies under images/<name>/
             },
             timeout=Duration.minutes(5),
             memory_size=1024,
@@ -113,6 +138,13 @@ class S3CloudFrontStack(Stack):
         # Grant the Lambda function permissions to write to the S3 bucket
         self.bucket.grant_read_write(upload_images_lambda)
 
+        # Allow the function to re-invoke itself to resume an interrupted sync. The ARN is built from the
+        # function name to avoid a dependency cycle between the function and its role
+        upload_images_lambda.add_to_role_policy(iam.PolicyStatement(
+            actions=["lambda:InvokeFunction"],
+            resources=[f"arn:aws:lambda:{self.region}:{self.account}:function:{self.app_name}-upload-product-images"]
+        ))
+
         # Create a unique name for the custom resource role
         unique_string = hashlib.md5(f"{self.app_name}-{self.region}".encode(), usedforsecurity=False).hexdigest()[:8]
         custom_resource_role_name = f"{self.app_name}-{unique_string}-upload-images-cr-role"
@@ -22,6 +22,41 @@ class Config:
         self.faq_vector_index_name="faq-policies"
         self.bedrock_agent_tags = {'AppName':f'{self.app_name}'}
 
+        # Product catalog KB document layout. "document" writes one text and metadata file per product. "sharded" packs
+        # products into size-bounded shard files, which a transformation Lambda splits into one chunk per product at ingestion.
+        # Changing the layout of a deployed knowledge base replaces its data source.
+        self.product_kb_document_layout = os.environ.get('PRODUCT_KB_DOCUMENT_LAYOUT', 'document')
+        self.product_kb_shard_buckets = 64 # Products are hashed into this many shard groups
+        self.product_kb_shard_max_bytes = 1024 * 1024 # Shard groups above this size are split into several files
+        # Shard files are written while the catalog is read, so at most shard_buckets * shard_max_bytes (64 MB) of shard text is in memory
+
+        # Product vector index HNSW settings. space_type is l2 or cosine. A larger m and ef_construction build a denser graph
+        # with better recall, ef_search trades query latency for recall. quantization is none, fp16 (half the vector memory)
+        # or byte (a quarter). byte uses the Lucene engine, which ignores ef_search and searches with ef equal to k. Measure
+        # the recall of a change with lambda/create_opensearch_index/evaluate_index_settings.py.
+        # They are only applied when the stack creates the index. Later deployments do not re-run the index custom resource,
+        # so changing a setting has no effect on an existing index until it is deleted and the stack creates it again
+        self.product_index_space_type = os.environ.get('PRODUCT_INDEX_SPACE_TYPE', 'l2')
+        self.product_index_hnsw_m = 16
+        self.product_index_hnsw_ef_construction = 100
+        self.product_index_hnsw_ef_search = 512
+        self.product_index_shards = 2
+        self.product_index_quantization = os.environ.get('PRODUCT_INDEX_QUANTIZATION', 'none')
+
+        # Resized product image copies generated at upload time, as name: maximum width and height in pixels
+        self.product_image_variants = {"thumb": 200, "medium": 400}
+
+        # Inventory service. The stock of the hot products, the few expected to get most of the orders, is split over
+        # this many counters to spread the writes. Every other product has one counter. Cart reservations that are
+        # not committed by an order expire and are restocked.
+        self.inventory_hot_product_ids = [product_id for product_id in os.environ.get('INVENTORY_HOT_PRODUCTS', '').split(',') if product_id]
+        self.inventory_hot_product_shards = 8
+        self.inventory_reservation_ttl_seconds = 900
+
+        # Sender of order confirmation emails. The address must be a verified Amazon SES identity. When it is not
+        # set, the email consumer is not deployed and queued emails expire unsent
+        self.order_email_sender = os.environ.get('ORDER_EMAIL_SENDER')
+
         # Add the SSM param names keys
         self.cloudfront_url_param = f"/{self.app_name}/cloudfront/url"
         self.product_service_url_param = f"/{self.app_name}/product-service/api-url"
@@ -6,6 +6,8 @@ from aws_cdk import (
     aws_s3 as s3,
     aws_s3_deployment as s3deploy,
     aws_lambda as lambda_,
+    aws_lambda_event_sources as lambda_event_sources,
+    aws_dynamodb as dynamodb,
     aws_logs as logs,
     aws_apigateway as apigw,
     aws_iam as iam,
@@ -64,6 +66,19 @@ class ProductServiceStack(Stack):
             iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSLambdaBasicExecutionRole")
         )
 
+        # Inventory table holding sharded stock counters and cart reservations. Pending reservations expire through TTL,
+        # and the stream is used to put the stock of expired reservations back
+        inventory_table = dynamodb.Table(
+            self, "InventoryTable",
+            table_name=f"{app_name}-inventory",
+            partition_key=dynamodb.Attribute(name="pk", type=dynamodb.AttributeType.STRING),
+            sort_key=dynamodb.Attribute(name="sk", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expiresAt",
+            stream=dynamodb.StreamViewType.OLD_IMAGE,
+            removal_policy=RemovalPolicy.DESTROY # RETAIN for production to avoid deletion of inventory
+        )
+
         # Enable Lambda Extension Layer for reading SSM Parameter and Secrets from local cache
         params_and_secrets = lambda_.ParamsAndSecretsLayerVersion.from_version(lambda_.ParamsAndSecretsVersions.V1_0_103,
             cache_size=500,
@@ -84,6 +99,11 @@ class ProductServiceStack(Stack):
                 "CLOUDFRONT_URL_PARAM": config.cloudfront_url_param,
                 "APP_URL_PARAM": config.app_url_param,
                 "BUCKET_NAME": self.app_data_bucket.bucket_name,
+                "INVENTORY_TABLE_NAME": inventory_table.table_name,
+                "INVENTORY_HOT_PRODUCTS": ",".join(config.inventory_hot_product_ids), # Product IDs with sharded stock counters
+                "INVENTORY_HOT_SHARDS": str(config.inventory_hot_product_shards), # Stock counters per hot product
+                "RESERVATION_TTL_SECONDS": str(config.inventory_reservation_ttl_seconds), # Uncommitted reservations expire after this
+                "IMAGE_VARIANTS": ",".join(f"{name}:{size}" for name, size in config.product_image_variants.items()), # Resized copies under images/<name>/
                 "SSM_PARAMETER_STORE_TTL" : "120" # Time to live for ssm parameter cache in seconds
             },
             params_and_secrets= params_and_secrets
@@ -91,6 +111,36 @@ class ProductServiceStack(Stack):
 
         # Grant read access to S3 Bucket
         self.app_data_bucket.grant_read(product_service_lambda)
+        inventory_table.grant_read_write_data(product_service_lambda)
+
+        # Restock expired reservations. Only TTL deletions are passed to the function
+        inventory_stream_lambda = lambda_.Function(
+            self, "InventoryStreamLambda",
+            runtime=lambda_.Runtime.PYTHON_3_12,
+            function_name=f"{app_name}-inventory-stream",
+            handler="inventory_stream.handler",
+            code=lambda_.Code.from_asset(lambda_code_path),
+            timeout=Duration.seconds(30),
+            environment={
+                "INVENTORY_TABLE_NAME": inventory_table.table_name
+            }
+        )
+        inventory_table.grant_read_write_data(inventory_stream_lambda)
+        inventory_stream_lambda.add_event_source(lambda_event_sources.DynamoEventSource(
+            inventory_table,
+            starting_position=lambda_.StartingPosition.LATEST,
+            batch_size=100,
+            bisect_batch_on_error=True,
+            retry_attempts=5,
+            report_batch_item_failures=True,
+            filters=[lambda_.FilterCriteria.filter({
+                "eventName": lambda_.FilterRule.is_equal("REMOVE"),
+                "userIdentity": {
+                    "type": lambda_.FilterRule.is_equal("Service"),
+                    "principalId": lambda_.FilterRule.is_equal("dynamodb.amazonaws.com")
+                }
+            })]
+        ))
 
         # Create a CloudWatch log group for API Gateway
         api_log_group = logs.LogGroup(self, f"{app_name}-api-logs",
@@ -182,6 +232,46 @@ class ProductServiceStack(Stack):
             api_key_required=True
         )
 
+        # POST /products/inventory:batch
+        inventory_batch = products.add_resource("inventory:batch")
+        inventory_batch.add_method(
+            "POST", 
+            apigw.LambdaIntegration(
+                product_service_lambda,
+                proxy=True  # Enable proxy integration for request passthrough
+            ),
+            api_key_required=True
+        )
+
+        # POST /inventory/reservations, POST /inventory/reservations/{reservationId}/commit
+        # and DELETE /inventory/reservations/{reservationId}
+        reservations = api.root.add_resource("inventory").add_resource("reservations")
+        reservations.add_method(
+            "POST", 
+            apigw.LambdaIntegration(
+                product_service_lambda,
+                proxy=True  # Enable proxy integration for request passthrough
+            ),
+            api_key_required=True
+        )
+        reservation_id = reservations.add_resource("{reservationId}")
+        reservation_id.add_method(
+            "DELETE", 
+            apigw.LambdaIntegration(
+                product_service_lambda,
+                proxy=True  # Enable proxy integration for request passthrough
+            ),
+            api_key_required=True
+        )
+        reservation_id.add_resource("commit").add_method(
+            "POST", 
+            apigw.LambdaIntegration(
+                product_service_lambda,
+                proxy=True  # Enable proxy integration for request passthrough
+            ),
+            api_key_required=True
+        )
+
         # Grant API Gateway permission to invoke the Lambda function
         product_service_lambda.grant_invoke(iam.ServicePrincipal("apigateway.amazonaws.com"))
 
@@ -61,6 +61,14 @@ class UploadCatalogAndKBSyncStack(Stack):
                 "BUCKET_PREFIX": config.product_vector_index_name,
                 "KNOWLEDGE_BASE_ID": knowledge_base_id,
                 "DATA_SOURCE_ID": data_source_id,
+                "UPLOAD_CONCURRENCY": "32", # Parallel S3 uploads of product documents
+                "DIRECT_INGESTION_MAX_DOCUMENTS": "50", # Larger catalog deltas start a full ingestion job
+                "CATALOG_KEY": "products.json", # JSON array, or a .jsonl key with one product per line
+                "MANIFEST_KEY": f"manifests/{config.product_vector_index_name}.json", # Product content hashes of the last sync, outside the KB data source prefix
+                "DOCUMENT_LAYOUT": config.product_kb_document_layout, # "document" or "sharded", must match the data source configuration
+                "SHARD_BUCKETS": str(config.product_kb_shard_buckets),
+                "SHARD_MAX_BYTES": str(config.product_kb_shard_max_bytes),
+                "WAIT_FOR_INGESTION": "true", # Poll the ingestion job to completion and publish its metrics. Set to false when a state machine polls with {"action": "checkIngestion"}
                 "SSM_PARAMETER_STORE_TTL" : "120" # Time to live for ssm parameter cache in seconds
             },
             params_and_secrets=params_and_secrets,
@@ -73,7 +81,10 @@ class UploadCatalogAndKBSyncStack(Stack):
 
         process_product_catalog_lambda.add_to_role_policy(iam.PolicyStatement(
             actions=[
-                "bedrock:StartIngestionJob"
+                "bedrock:StartIngestionJob",
+                "bedrock:GetIngestionJob",
+                "bedrock:IngestKnowledgeBaseDocuments",
+                "bedrock:DeleteKnowledgeBaseDocuments"
             ],
             resources=[f"arn:aws:bedrock:{self.region}:{self.account}:knowledge-base/{knowledge_base_id}"]
         ))
@@ -0,0 +1,23 @@
+import os
+import sys
+import importlib
+
+LAMBDA_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "lambda"))
+
+def load_lambda_modules(function_dir, *names):
+    """Import modules from a Lambda function folder and return them.
+
+    Lambda folders reuse module names such as index and local_clients, so the modules
+    imported from a folder are removed from sys.modules again once they are loaded.
+    """
+    path = os.path.join(LAMBDA_ROOT, function_dir)
+    loaded_before = set(sys.modules)
+    sys.path.insert(0, path)
+    try:
+        return [importlib.import_module(name) for name in names]
+    finally:
+        sys.path.remove(path)
+        for name in set(sys.modules) - loaded_before:
+            module_file = getattr(sys.modules[name], '__file__', None) or ''
+            if os.path.abspath(module_file).startswith(LAMBDA_ROOT):
+                del sys.modules[name]
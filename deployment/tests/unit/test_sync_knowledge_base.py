@@ -0,0 +1,46 @@
+from tests.unit.lambda_modules import load_lambda_modules
+
+kb_ingestion, local_clients = load_lambda_modules("upload_product_catalog_and_sync_kb", "kb_ingestion", "local_clients")
+
+BUCKET = "catalog"
+
+def document_keys(start, count):
+    return [f"products/{i}.txt" for i in range(start, start + count)]
+
+def operations(bedrock_agent):
+    return [operation for operation, _ in bedrock_agent.calls]
+
+def sync(bedrock_agent, changed_keys, removed_keys, max_direct_documents=50):
+    return kb_ingestion.sync_knowledge_base(bedrock_agent, "KB", "DS", BUCKET, changed_keys, removed_keys, max_direct_documents)
+
+def test_small_delta_is_ingested_and_deleted_directly():
+    bedrock_agent = local_clients.FakeBedrockAgentClient()
+    sync(bedrock_agent, document_keys(0, 25), [])
+    bedrock_agent.calls.clear()
+
+    result = sync(bedrock_agent, document_keys(20, 12), document_keys(0, 5))
+
+    assert result == {"message": "Documents ingested directly", "mode": "direct", "ingested": 12, "deleted": 5}
+    # Batches of at most 10 documents each way
+    assert operations(bedrock_agent) == ['ingest_knowledge_base_documents'] * 2 + ['delete_knowledge_base_documents']
+    assert sorted(bedrock_agent.documents) == sorted(f"s3://{BUCKET}/{key}" for key in document_keys(5, 27))
+    document = bedrock_agent.documents[f"s3://{BUCKET}/products/20.txt"]
+    assert document['metadata']['s3Location']['uri'] == f"s3://{BUCKET}/products/20.txt.metadata.json"
+
+def test_large_delta_starts_an_ingestion_job():
+    bedrock_agent = local_clients.FakeBedrockAgentClient()
+
+    result = sync(bedrock_agent, document_keys(0, 40), document_keys(40, 20))
+
+    assert result['mode'] == 'ingestion_job'
+    assert operations(bedrock_agent) == ['start_ingestion_job']
+
+def test_failed_document_falls_back_to_an_ingestion_job():
+    bedrock_agent = local_clients.FakeBedrockAgentClient(fail_uris=[f"s3://{BUCKET}/products/3.txt"])
+
+    result = sync(bedrock_agent, document_keys(0, 5), [])
+
+    assert result['mode'] == 'ingestion_job'
+    assert operations(bedrock_agent) == ['ingest_knowledge_base_documents', 'start_ingestion_job']
+    job = kb_ingestion.wait_for_ingestion_job(bedrock_agent, "KB", "DS", result['jobId'], timeout_seconds=10, initial_delay=0)
+    assert job['status'] == 'COMPLETE'
@@ -0,0 +1,87 @@
+import io
+import os
+import tarfile
+from unittest import mock
+import pytest
+from PIL import Image
+from tests.unit.lambda_modules import load_lambda_modules
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+index, local_clients = load_lambda_modules("upload_product_images", "index", "local_clients")
+
+IMAGE_COUNT = 12
+
+def make_jpeg(seed):
+    output = io.BytesIO()
+    Image.new('RGB', (640, 480), (seed * 20 % 256, 80, 160)).save(output, format='JPEG')
+    return output.getvalue()
+
+def make_archive(count):
+    output = io.BytesIO()
+    with tarfile.open(fileobj=output, mode='w:gz') as tar:
+        for i in range(count):
+            data = make_jpeg(i)
+            member = tarfile.TarInfo(f"images/{i}.jpg")
+            member.size = len(data)
+            tar.addfile(member, io.BytesIO(data))
+    return output.getvalue()
+
+def make_context(remaining_millis=(60000,)):
+    """Lambda context whose remaining time follows remaining_millis, repeating the last value."""
+    context = mock.Mock(function_name="upload-product-images")
+    values = list(remaining_millis)
+    context.get_remaining_time_in_millis.side_effect = lambda: values.pop(0) if len(values) > 1 else values[0]
+    return context
+
+def run_sync(archive, context, event=None):
+    with local_clients.LocalFileServer(archive) as url, mock.patch.dict(os.environ, {"BUCKET_NAME": "images", "IMAGES_URL": url}):
+        return index.handler(event or {}, context)
+
+def image_puts(s3):
+    return [key for operation, key in s3.calls if not key.startswith("manifests/")]
+
+@pytest.fixture
+def s3(monkeypatch):
+    client = local_clients.LocalS3Client()
+    monkeypatch.setattr(index, "s3", client)
+    monkeypatch.setattr(index, "lambda_client", mock.Mock())
+    monkeypatch.setattr(index, "image_variants", {"thumb": 200, "medium": 400})
+    return client
+
+def test_streams_images_and_variants_to_s3(s3):
+    response = run_sync(make_archive(IMAGE_COUNT), make_context())
+
+    assert response['statusCode'] == 200
+    for i in range(IMAGE_COUNT):
+        assert s3.objects[("images", f"images/{i}.jpg")]['ContentType'] == 'image/jpeg'
+        with Image.open(io.BytesIO(s3.objects[("images", f"images/thumb/{i}.jpg")]['Body'])) as thumb:
+            assert max(thumb.size) == 200
+    assert ("images", "manifests/images.json") in s3.objects
+
+def test_rerun_skips_unchanged_images(s3):
+    archive = make_archive(IMAGE_COUNT)
+    run_sync(archive, make_context())
+    s3.calls.clear()
+
+    response = run_sync(archive, make_context())
+
+    assert response['statusCode'] == 200
+    assert image_puts(s3) == []
+
+def test_interrupted_sync_checkpoints_and_resumes(s3):
+    archive = make_archive(IMAGE_COUNT)
+    # Enough time for 5 images, then the stop margin is reached
+    response = run_sync(archive, make_context([60000] * 5 + [1000]))
+
+    assert response['statusCode'] == 202
+    assert index.lambda_client.invoke.call_args.kwargs['InvocationType'] == 'Event'
+    first_run = set(image_puts(s3))
+    assert len(first_run) == 5 * 3
+
+    s3.calls.clear()
+    response = run_sync(archive, make_context(), {"resume": True, "attempt": 1})
+
+    assert response['statusCode'] == 200
+    second_run = set(image_puts(s3))
+    assert len(second_run) == (IMAGE_COUNT - 5) * 3
+    assert first_run.isdisjoint(second_run)
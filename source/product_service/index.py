@@ -3,6 +3,7 @@ import os
 import logging
 import urllib
 import boto3
+from inventory import get_inventory_store
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -38,6 +39,14 @@ def get_ssm_parameter(param_name):
         logger.error(f"An unexpected error occurred: {e}")
         return ""
 
+def parse_image_variants(value):
+    """Parse "thumb:200,medium:400" into [("thumb", 200), ("medium", 400)], smallest first."""
+    variants = []
+    for item in filter(None, value.split(',')):
+        name, size = item.split(':')
+        variants.append((name.strip(), int(size)))
+    return sorted(variants, key=lambda variant: variant[1])
+
 def download_file_from_s3(bucket, key):
     try:
         response = s3.get_object(Bucket=bucket, Key=key)
@@ -63,29 +72,89 @@ def create_response(status_code, body):
         'headers': {
             'Access-Control-Allow-Origin': '*',  # Allow all origins
             'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
-            'Access-Control-Allow-Methods': 'GET,OPTIONS'
+            'Access-Control-Allow-Methods': 'GET,POST,DELETE,OPTIONS'
         },
         'body': json.dumps(body)
     }
 
+def add_product_urls(product, app_url, cloudfront_url):
+    image = product['image']
+    product['image'] = f"{cloudfront_url}/images/{image}"
+    # Smallest first, so clients can pick the first variant that is wide enough
+    product['image_variants'] = [
+        {"name": name, "width": size, "url": f"{cloudfront_url}/images/{name}/{image}"} for name, size in image_variants
+    ]
+    product['url'] = f"{app_url}/product/?product_id={product['id']}"
+    return product
+
 def get_product_by_id(product_id, app_url, cloudfront_url):
     product = next((p.copy() for p in PRODUCTS if p['id'] == product_id), None)
     if product:
-        product['image'] = f"{cloudfront_url}/images/{product['image']}"
-        product['url'] = f"{app_url}/product/?product_id={product['id']}"
-        return create_response(200, product)
+        product['current_stock'] = inventory.get_stock([product_id])[product_id]
+        return create_response(200, add_product_urls(product, app_url, cloudfront_url))
     else:
         return create_response(404, {'message': 'Product not found'})
 
 
 def get_featured_products(app_url, cloudfront_url):
+    # The listing can hold the whole catalog, so it keeps the catalog current_stock. Live stock is
+    # returned for a single product and checked for the cart when the order is placed
     featured_products = [p.copy() for p in PRODUCTS if p.get('featured', True)]
     for product in featured_products:
-        product['image'] = f"{cloudfront_url}/images/{product['image']}"
-        product['url'] = f"{app_url}/product/?product_id={product['id']}"
+        add_product_urls(product, app_url, cloudfront_url)
     return create_response(200, featured_products)
 
+def parse_inventory_items(body):
+    """Parse {"items": [{"productId": ..., "quantity": ...}]} into (product_id, quantity) pairs, or None if invalid."""
+    try:
+        items = json.loads(body or '{}')['items']
+        requested = [(str(item['productId']), int(item.get('quantity', 1))) for item in items]
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError, AttributeError):
+        return None
+    if not requested or len(requested) > max_inventory_batch_size or any(quantity < 1 for _, quantity in requested):
+        return None
+    return requested
+
+def invalid_items_response():
+    return create_response(400, {'message': f'Request body must be {{"items": [{{"productId": ..., "quantity": ...}}]}} with 1 to {max_inventory_batch_size} items and positive quantities'})
+
+def check_inventory_batch(body):
+    requested = parse_inventory_items(body)
+    if requested is None:
+        return invalid_items_response()
+    results = inventory.get_availability(requested)
+    return create_response(200, {'items': results, 'allAvailable': all(item['available'] for item in results)})
+
+def reserve_inventory(body):
+    requested = parse_inventory_items(body)
+    if requested is None:
+        return invalid_items_response()
+    reservation_id = json.loads(body).get('reservationId')
+    if not reservation_id:
+        return create_response(400, {'message': 'reservationId is required'})
+    reservation = inventory.reserve(str(reservation_id), requested)
+    return create_response(200 if reservation['reserved'] else 409, reservation)
+
+def commit_reservation(reservation_id):
+    reservation = inventory.commit(reservation_id)
+    if reservation is None:
+        return create_response(404, {'message': 'Reservation not found'})
+    return create_response(200, reservation)
+
+def release_reservation(reservation_id):
+    result = inventory.release(reservation_id)
+    if result is None:
+        return create_response(404, {'message': 'Reservation not found'})
+    return create_response(200, result)
+
 PRODUCTS = load_products()
+PRODUCTS_BY_ID = {product['id']: product for product in PRODUCTS}
+# Live stock and cart reservations, seeded from the catalog's current_stock
+inventory = get_inventory_store(PRODUCTS_BY_ID)
+# Largest number of cart items checked by a single inventory batch request
+max_inventory_batch_size = 50
+# Resized image copies stored under images/<name>/ by the image upload
+image_variants = parse_image_variants(os.environ.get('IMAGE_VARIANTS', ''))
 
 def handler(event, context):
     logger.info(f"Received event: {json.dumps(event)}")
@@ -103,5 +172,13 @@ def handler(event, context):
         return get_product_by_id(product_id, app_url, cloudfront_url)
     elif path == '/products/featured' and http_method == 'GET':
         return get_featured_products(app_url, cloudfront_url)
+    elif path == '/products/inventory:batch' and http_method == 'POST':
+        return check_inventory_batch(event.get('body'))
+    elif path == '/inventory/reservations' and http_method == 'POST':
+        return reserve_inventory(event.get('body'))
+    elif path == '/inventory/reservations/{reservationId}/commit' and http_method == 'POST':
+        return commit_reservation(event['pathParameters']['reservationId'])
+    elif path == '/inventory/reservations/{reservationId}' and http_method == 'DELETE':
+        return release_reservation(event['pathParameters']['reservationId'])
     else:
         return create_response(404, {'message': 'Resource Not Found'})
@@ -0,0 +1,418 @@
+import os
+import time
+import random
+import logging
+import threading
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+
+logger = logging.getLogger()
+
+PENDING = "PENDING"
+COMMITTED = "COMMITTED"
+# DynamoDB transactions are limited to 100 actions and BatchGetItem to 100 keys
+MAX_TRANSACTION_ITEMS = 100
+MAX_BATCH_GET_KEYS = 100
+RESERVE_ATTEMPTS = 3
+# Restock markers are kept this long to ignore redelivered stream records
+RESTOCK_MARKER_TTL_SECONDS = 24 * 60 * 60
+
+def merge_items(items):
+    """Sum the quantities of (product_id, quantity) pairs listed more than once."""
+    merged = {}
+    for product_id, quantity in items:
+        merged[product_id] = merged.get(product_id, 0) + quantity
+    return merged
+
+def allocate(levels, quantity):
+    """Split quantity over stock shards, as {shard: quantity}, or return None if there is not enough stock.
+
+    A random shard that can cover the whole quantity is preferred, so concurrent buyers of the
+    same product spread their writes over the shards. Otherwise the fullest shards are used.
+    """
+    covering = [shard for shard, available in levels.items() if available >= quantity]
+    if covering:
+        return {random.choice(covering): quantity}
+
+    allocations = {}
+    remaining = quantity
+    for shard, available in sorted(levels.items(), key=lambda level: -level[1]):
+        if remaining <= 0:
+            break
+        if available > 0:
+            allocations[shard] = min(available, remaining)
+            remaining -= allocations[shard]
+    return allocations if remaining <= 0 else None
+
+class InventoryStore:
+    """Catalog lookups shared by the DynamoDB and in-memory inventory stores.
+
+    A product's stock starts at its catalog current_stock the first time it is read. The stock of
+    the hot_product_ids, the few products expected to get most of the orders, is split over
+    hot_shards counters that are decremented independently, instead of every order updating the
+    same item. Every other product has a single counter.
+    """
+
+    def __init__(self, catalog=None, hot_product_ids=(), hot_shards=8, reservation_ttl_seconds=900):
+        self.catalog = catalog or {}
+        self.hot_product_ids = set(hot_product_ids)
+        self.hot_shards = hot_shards
+        self.reservation_ttl_seconds = reservation_ttl_seconds
+
+    def get_shard_count(self, product_id):
+        return self.hot_shards if product_id in self.hot_product_ids else 1
+
+    def get_initial_levels(self, product_id):
+        """The catalog stock divided as evenly as possible over the product's shards."""
+        shard_count = self.get_shard_count(product_id)
+        product = self.catalog.get(product_id)
+        base, remainder = divmod(int(product.get('current_stock', 0)) if product else 0, shard_count)
+        return {shard: base + (shard < remainder) for shard in range(shard_count)}
+
+    def get_stock(self, product_ids):
+        """Return {product_id: available quantity}."""
+        return {product_id: sum(levels.values()) for product_id, levels in self.get_levels(product_ids).items()}
+
+    def get_availability(self, items, stock=None):
+        stock = stock if stock is not None else self.get_stock(list(merge_items(items)))
+        return [{
+            'productId': product_id,
+            'name': self.catalog.get(product_id, {}).get('name'),
+            'found': product_id in self.catalog,
+            'requestedQuantity': quantity,
+            'currentStock': stock[product_id],
+            'available': stock[product_id] >= quantity
+        } for product_id, quantity in merge_items(items).items()]
+
+class DynamoDBInventoryStore(InventoryStore):
+    """Stock counters and reservations in a DynamoDB table with pk and sk keys.
+
+    Each stock shard is its own PRODUCT#<id>#<shard> partition, so the shards of a hot product
+    are written on different partitions. A reservation holds one RESERVATION#<id> item per
+    product recording which shards were decremented, and is written in the same transaction as
+    the conditional decrements. Pending reservations carry an expiresAt TTL. When DynamoDB
+    deletes an expired one, restock_expired_reservation puts its stock back from the table stream.
+    """
+
+    def __init__(self, table_name, catalog=None, hot_product_ids=(), hot_shards=8, reservation_ttl_seconds=900, dynamodb=None):
+        super().__init__(catalog, hot_product_ids, hot_shards, reservation_ttl_seconds)
+        self.table_name = table_name
+        self.dynamodb = dynamodb or boto3.resource('dynamodb')
+        self.table = self.dynamodb.Table(table_name)
+        self.client = self.dynamodb.meta.client
+
+    @staticmethod
+    def get_stock_key(product_id, shard):
+        return {"pk": f"PRODUCT#{product_id}#{shard}", "sk": "STOCK"}
+
+    def get_levels(self, product_ids):
+        """Return {product_id: {shard: available}}, creating the counters of products read for the first time."""
+        keys = [self.get_stock_key(product_id, shard) for product_id in product_ids for shard in range(self.get_shard_count(product_id))]
+        found = {}
+        for start in range(0, len(keys), MAX_BATCH_GET_KEYS):
+            request = {self.table_name: {"Keys": keys[start:start + MAX_BATCH_GET_KEYS], "ConsistentRead": True}}
+            while request:
+                response = self.dynamodb.batch_get_item(RequestItems=request)
+                for item in response['Responses'].get(self.table_name, []):
+                    found[item['pk']] = int(item['available'])
+                request = response.get('UnprocessedKeys')
+
+        levels = {}
+        missing = []
+        for product_id in product_ids:
+            shard_keys = [self.get_stock_key(product_id, shard)['pk'] for shard in range(self.get_shard_count(product_id))]
+            if any(key in found for key in shard_keys):
+                levels[product_id] = {shard: found.get(key, 0) for shard, key in enumerate(shard_keys)}
+            else:
+                missing.append(product_id)
+        if missing:
+            levels.update(self.create_counters(missing))
+        return levels
+
+    def create_counters(self, product_ids):
+        """Create the counters of products read for the first time and return their levels.
+
+        The counters of many products are put in each transaction, so a cold table is seeded in
+        a few writes. The puts are conditional, so counters created concurrently are never reset.
+        """
+        levels = {product_id: self.get_initial_levels(product_id) for product_id in product_ids}
+        batches, batch = [], []
+        for product_id in product_ids:
+            if product_id not in self.catalog:
+                continue
+            if len(batch) + len(levels[product_id]) > MAX_TRANSACTION_ITEMS:
+                batches.append(batch)
+                batch = []
+            batch.extend((product_id, shard, available) for shard, available in levels[product_id].items())
+        if batch:
+            batches.append(batch)
+
+        for batch in batches:
+            try:
+                self.client.transact_write_items(TransactItems=[{
+                    "Put": {
+                        "TableName": self.table_name,
+                        "Item": {**self.get_stock_key(product_id, shard), "productId": product_id, "available": available},
+                        "ConditionExpression": "attribute_not_exists(pk)"
+                    }
+                } for product_id, shard, available in batch])
+                logger.info(f"Created {len(batch)} stock counters")
+            except self.client.exceptions.TransactionCanceledException:
+                # Another request created some of the counters first, read this batch back
+                batch_product_ids = list(dict.fromkeys(product_id for product_id, _, _ in batch))
+                levels.update(self.get_levels(batch_product_ids))
+        return levels
+
+    def get_reservation(self, reservation_id):
+        """Return the reservation's items, or None if it does not exist."""
+        response = self.table.query(
+            KeyConditionExpression="pk = :pk",
+            ExpressionAttributeValues={":pk": f"RESERVATION#{reservation_id}"},
+            ConsistentRead=True
+        )
+        if not response['Items']:
+            return None
+        return {
+            'reservationId': reservation_id,
+            'reserved': True,
+            'status': COMMITTED if all(item['status'] == COMMITTED for item in response['Items']) else PENDING,
+            'items': [{'productId': item['productId'], 'quantity': int(item['quantity'])} for item in response['Items']]
+        }
+
+    def reserve(self, reservation_id, items):
+        """Atomically decrement the stock of every item and record the reservation.
+
+        Returns the reservation, or reserved False with per item availability if any item is out
+        of stock. Reserving an existing reservation ID returns it unchanged.
+        """
+        existing = self.get_reservation(reservation_id)
+        if existing is not None:
+            return existing
+
+        quantities = merge_items(items)
+        expires_at = int(time.time()) + self.reservation_ttl_seconds
+        for attempt in range(RESERVE_ATTEMPTS):
+            levels = self.get_levels(list(quantities))
+            allocations = {product_id: allocate(levels[product_id], quantity) for product_id, quantity in quantities.items()}
+            if any(allocation is None for allocation in allocations.values()):
+                stock = {product_id: sum(shards.values()) for product_id, shards in levels.items()}
+                return {'reservationId': reservation_id, 'reserved': False, 'items': self.get_availability(items, stock)}
+
+            actions = []
+            for product_id, allocation in allocations.items():
+                for shard, quantity in allocation.items():
+                    actions.append({"Update": {
+                        "TableName": self.table_name,
+                        "Key": self.get_stock_key(product_id, shard),
+                        "UpdateExpression": "SET available = available - :quantity",
+                        "ConditionExpression": "available >= :quantity",
+                        "ExpressionAttributeValues": {":quantity": quantity}
+                    }})
+                actions.append({"Put": {
+                    "TableName": self.table_name,
+                    "Item": {
+                        "pk": f"RESERVATION#{reservation_id}",
+                        "sk": f"PRODUCT#{product_id}",
+                        "productId": product_id,
+                        "quantity": quantities[product_id],
+                        "allocations": {str(shard): quantity for shard, quantity in allocation.items()},
+                        "status": PENDING,
+                        "expiresAt": expires_at
+                    },
+                    "ConditionExpression": "attribute_not_exists(pk)"
+                }})
+            if len(actions) > MAX_TRANSACTION_ITEMS:
+                raise ValueError(f"Reservation needs {len(actions)} writes, more than the {MAX_TRANSACTION_ITEMS} allowed in a transaction")
+
+            try:
+                self.client.transact_write_items(TransactItems=actions)
+                return {
+                    'reservationId': reservation_id,
+                    'reserved': True,
+                    'status': PENDING,
+                    'expiresAt': expires_at,
+                    'items': [{'productId': product_id, 'quantity': quantity} for product_id, quantity in quantities.items()]
+                }
+            except self.client.exceptions.TransactionCanceledException as e:
+                reasons = e.response.get('CancellationReasons', [])
+                if any(reason.get('Code') == 'ConditionalCheckFailed' and 'Put' in action for reason, action in zip(reasons, actions)):
+                    # The same reservation was written concurrently
+                    return self.get_reservation(reservation_id)
+                logger.info(f"Stock changed while reserving {reservation_id}, retrying (attempt {attempt + 1})")
+
+        stock = self.get_stock(list(quantities))
+        return {'reservationId': reservation_id, 'reserved': False, 'items': self.get_availability(items, stock)}
+
+    def commit(self, reservation_id):
+        """Make a pending reservation permanent by removing its expiry. Returns None if it does not exist."""
+        reservation = self.get_reservation(reservation_id)
+        if reservation is None:
+            return None
+        for item in reservation['items']:
+            try:
+                self.table.update_item(
+                    Key={"pk": f"RESERVATION#{reservation_id}", "sk": f"PRODUCT#{item['productId']}"},
+                    UpdateExpression="SET #status = :committed REMOVE expiresAt",
+                    ConditionExpression="#status = :pending",
+                    ExpressionAttributeNames={"#status": "status"},
+                    ExpressionAttributeValues={":committed": COMMITTED, ":pending": PENDING}
+                )
+            except self.client.exceptions.ConditionalCheckFailedException:
+                pass
+        reservation['status'] = COMMITTED
+        return reservation
+
+    def release(self, reservation_id):
+        """Cancel a reservation and put its stock back, whether it is pending or committed.
+
+        The order service releases a committed reservation when storing its order fails.
+        """
+        response = self.table.query(
+            KeyConditionExpression="pk = :pk",
+            ExpressionAttributeValues={":pk": f"RESERVATION#{reservation_id}"},
+            ConsistentRead=True
+        )
+        if not response['Items']:
+            return None
+        released = False
+        for item in response['Items']:
+            try:
+                # The status condition skips items committed, released or expired since they were read
+                self.client.transact_write_items(TransactItems=[{"Delete": {
+                    "TableName": self.table_name,
+                    "Key": {"pk": item['pk'], "sk": item['sk']},
+                    "ConditionExpression": "#status = :status",
+                    "ExpressionAttributeNames": {"#status": "status"},
+                    "ExpressionAttributeValues": {":status": item['status']}
+                }}] + self.get_restock_actions(item))
+                released = True
+            except self.client.exceptions.TransactionCanceledException:
+                logger.info(f"Reservation {reservation_id} for {item['productId']} changed while it was released")
+        return {'reservationId': reservation_id, 'released': released}
+
+    def get_restock_actions(self, reservation_item):
+        return [{"Update": {
+            "TableName": self.table_name,
+            "Key": self.get_stock_key(reservation_item['productId'], shard),
+            "UpdateExpression": "ADD available :quantity",
+            "ExpressionAttributeValues": {":quantity": int(quantity)}
+        }} for shard, quantity in reservation_item['allocations'].items()]
+
+    def restock_expired_reservation(self, old_image):
+        """Put back the stock of a pending reservation item deleted by TTL, given its stream OldImage.
+
+        A marker item written in the same transaction makes redelivered stream records a no-op.
+        """
+        deserializer = TypeDeserializer()
+        item = {key: deserializer.deserialize(value) for key, value in old_image.items()}
+        if not item['pk'].startswith("RESERVATION#") or item.get('status') != PENDING:
+            return False
+        try:
+            self.client.transact_write_items(TransactItems=[{"Put": {
+                "TableName": self.table_name,
+                "Item": {
+                    "pk": item['pk'].replace("RESERVATION#", "RESTOCK#", 1),
+                    "sk": item['sk'],
+                    "expiresAt": int(time.time()) + RESTOCK_MARKER_TTL_SECONDS
+                },
+                "ConditionExpression": "attribute_not_exists(pk)"
+            }}] + self.get_restock_actions(item))
+        except self.client.exceptions.TransactionCanceledException:
+            logger.info(f"Expired reservation {item['pk']} {item['sk']} was already restocked")
+            return False
+        logger.info(f"Restocked {int(item['quantity'])} of {item['productId']} from expired reservation {item['pk']}")
+        return True
+
+class MemoryInventoryStore(InventoryStore):
+    """In-process stand-in for DynamoDBInventoryStore, for running the product service locally.
+
+    Expired pending reservations are released on the next call, in place of the TTL deletion.
+    """
+
+    def __init__(self, catalog=None, hot_product_ids=(), hot_shards=8, reservation_ttl_seconds=900):
+        super().__init__(catalog, hot_product_ids, hot_shards, reservation_ttl_seconds)
+        self.lock = threading.RLock()
+        self.levels = {}
+        self.reservations = {}
+
+    def expire_reservations(self):
+        now = time.time()
+        for reservation_id, reservation in list(self.reservations.items()):
+            if reservation['status'] == PENDING and reservation['expiresAt'] <= now:
+                self.release(reservation_id)
+
+    def get_levels(self, product_ids):
+        with self.lock:
+            self.expire_reservations()
+            for product_id in product_ids:
+                if product_id not in self.levels:
+                    self.levels[product_id] = self.get_initial_levels(product_id)
+            return {product_id: dict(self.levels[product_id]) for product_id in product_ids}
+
+    def get_reservation(self, reservation_id):
+        with self.lock:
+            reservation = self.reservations.get(reservation_id)
+            if reservation is None:
+                return None
+            return {
+                'reservationId': reservation_id,
+                'reserved': True,
+                'status': reservation['status'],
+                'items': [{'productId': product_id, 'quantity': quantity} for product_id, quantity in reservation['quantities'].items()]
+            }
+
+    def reserve(self, reservation_id, items):
+        with self.lock:
+            existing = self.get_reservation(reservation_id)
+            if existing is not None:
+                return existing
+
+            quantities = merge_items(items)
+            levels = self.get_levels(list(quantities))
+            allocations = {product_id: allocate(levels[product_id], quantity) for product_id, quantity in quantities.items()}
+            if any(allocation is None for allocation in allocations.values()):
+                return {'reservationId': reservation_id, 'reserved': False, 'items': self.get_availability(items)}
+
+            for product_id, allocation in allocations.items():
+                for shard, quantity in allocation.items():
+                    self.levels[product_id][shard] -= quantity
+            expires_at = int(time.time()) + self.reservation_ttl_seconds
+            self.reservations[reservation_id] = {
+                'quantities': quantities,
+                'allocations': allocations,
+                'status': PENDING,
+                'expiresAt': expires_at
+            }
+            reservation = self.get_reservation(reservation_id)
+            reservation['expiresAt'] = expires_at
+            return reservation
+
+    def commit(self, reservation_id):
+        with self.lock:
+            reservation = self.reservations.get(reservation_id)
+            if reservation is None:
+                return None
+            reservation['status'] = COMMITTED
+            return self.get_reservation(reservation_id)
+
+    def release(self, reservation_id):
+        with self.lock:
+            reservation = self.reservations.get(reservation_id)
+            if reservation is None:
+                return None
+            for product_id, allocation in reservation['allocations'].items():
+                for shard, quantity in allocation.items():
+                    self.levels[product_id][shard] += quantity
+            del self.reservations[reservation_id]
+            return {'reservationId': reservation_id, 'released': True}
+
+def get_inventory_store(catalog):
+    """DynamoDB when INVENTORY_TABLE_NAME is set, otherwise an in-memory store seeded from the catalog."""
+    hot_product_ids = [product_id.strip() for product_id in os.environ.get('INVENTORY_HOT_PRODUCTS', '').split(',') if product_id.strip()]
+    hot_shards = int(os.environ.get('INVENTORY_HOT_SHARDS', '8'))
+    reservation_ttl_seconds = int(os.environ.get('RESERVATION_TTL_SECONDS', '900'))
+    table_name = os.environ.get('INVENTORY_TABLE_NAME')
+    if table_name:
+        return DynamoDBInventoryStore(table_name, catalog, hot_product_ids, hot_shards, reservation_ttl_seconds)
+    logger.warning("INVENTORY_TABLE_NAME is not set. Inventory is kept in memory only.")
+    return MemoryInventoryStore(catalog, hot_product_ids, hot_shards, reservation_ttl_seconds)
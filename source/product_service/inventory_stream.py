@@ -0,0 +1,23 @@
+import os
+import logging
+from inventory import DynamoDBInventoryStore
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+inventory = DynamoDBInventoryStore(os.environ['INVENTORY_TABLE_NAME'])
+
+def handler(event, context):
+    """Put back the stock of pending reservations deleted by the inventory table's TTL.
+
+    Only TTL deletions reach this function, through the event source filter. Records that fail
+    are reported back so only they are retried.
+    """
+    failures = []
+    for record in event['Records']:
+        try:
+            inventory.restock_expired_reservation(record['dynamodb']['OldImage'])
+        except Exception as e:
+            logger.error(f"Failed to restock expired reservation {record['dynamodb'].get('Keys')}: {e}")
+            failures.append({"itemIdentifier": record['dynamodb']['SequenceNumber']})
+    return {"batchItemFailures": failures}
@@ -1,15 +1,14 @@
 import streamlit as st
 import re, io, json, os
 import pandas as pd
-import shutil
 import uuid
 from utils.logger import get_logger
 from utils.authenticate import authenticate_user
 from utils.studio_style import apply_studio_style, get_background
 from utils.studio_style import keyword_label
-from utils.helper import resize_image, encode_image
-from utils.config import Config
-from utils.bedrock import BedrockAgent
+from utils.helper import encode_image, get_image_url
+from utils.config import get_config
+from utils.bedrock import get_bedrock_agent
 from utils.product_service import ProductService
 from datetime import datetime
 
@@ -20,16 +19,6 @@ st.set_page_config(
     layout='wide'
 )
 
-def reset_chat_directory():
-    chat_dir = st.session_state.chat_directory
-    
-    # If the directory exists, delete it
-    if os.path.exists(chat_dir):
-        shutil.rmtree(chat_dir)
-    
-    # Create a new chat directory
-    os.makedirs(chat_dir)
-
 def load_agent_session_state():
     # Send current time for time awareness to LLM
     current_time = datetime.now()
@@ -66,7 +55,6 @@ def load_agent_session_state():
 
 def initialize_session_state():
     st.session_state.welcome_message = "Hello! Welcome to AnyCompanyCommerce. I'm your AI shopping assistant here to help you find products that match your needs and interests. How can I assist you today?"
-    st.session_state.chat_directory = os.path.join("temp", "chat")
     if 'messages' in st.session_state and st.session_state.messages and  len(st.session_state.messages) > 1:
         GetAnswers(' ', st.session_state.session_id, 
                     st.session_state.bedrock_agent, 
@@ -77,13 +65,14 @@ def initialize_session_state():
     st.session_state.total_input_tokens=0
     st.session_state.total_output_tokens=0
     st.session_state.total_invoke_agent=0
+    st.session_state.total_image_tokens=0
         
     if 'config' not in st.session_state:
-        st.session_state.config = Config()
+        st.session_state.config = get_config()
     if 'logger' not in st.session_state:
         st.session_state.logger = get_logger('retail-ai-agent')
     if 'bedrock_agent' not in st.session_state:
-        st.session_state.bedrock_agent = BedrockAgent(st.session_state.config.SESSION, st.session_state.logger)
+        st.session_state.bedrock_agent = get_bedrock_agent(st.session_state.config.SESSION, st.session_state.logger)
     if 'product_service' not in st.session_state:
         st.session_state.product_service = ProductService(st.session_state.config.API_URL, st.session_state.config.API_KEY, st.session_state.logger)
     if 'total_input_tokens' not in st.session_state:
@@ -92,6 +81,8 @@ def initialize_session_state():
         st.session_state.total_output_tokens =0
     if 'total_invoke_agent' not in st.session_state:
         st.session_state.total_invoke_agent =0
+    if 'total_image_tokens' not in st.session_state:
+        st.session_state.total_image_tokens =0
 
     st.session_state.session_id = str(uuid.uuid4())
     st.session_state.messages = []
@@ -108,7 +99,6 @@ def initialize_session_state():
     st.session_state.cart = []
 
     load_agent_session_state()
-    reset_chat_directory()
 
 @st.cache_data
 def load_random_user_profiles():
@@ -127,10 +117,10 @@ def load_random_user_profiles():
         print(f"An unexpected error occurred: {str(e)}")
         return None
 
-def GetAnswers(query, session_id, assistant, agent_id, agent_alias_id, agent_session_state, base64_image= None, end_session: bool = False):
+def GetAnswers(query, session_id, assistant, agent_id, agent_alias_id, agent_session_state, base64_image= None, end_session: bool = False, image_media_type='image/jpeg'):
 
     st.session_state.total_invoke_agent += 1
-    answer = assistant.invoke_agent(agent_id, agent_alias_id, session_id, agent_session_state, query, base64_image, end_session)
+    answer = assistant.invoke_agent(agent_id, agent_alias_id, session_id, agent_session_state, query, base64_image, end_session, image_media_type)
     st.session_state.answer = answer
 
     return answer
@@ -185,12 +175,12 @@ def display_product_list_2(products_list):
                 product_details = st.session_state.product_service.get_product_details(product_id)
                 if product_details:
                     products_history += f"""
-                | <img src="{product_details["image"]}" width="100" alt="{product_details["name"]}"> | {i}. **{product_details["name"]}** | Price: ${product_details["price"]} |
+                | <img src="{get_image_url(product_details, 100)}" width="100" alt="{product_details["name"]}"> | {i}. **{product_details["name"]}** | Price: ${product_details["price"]} |
                 """
 
                     col1, col2 = st.columns([1, 2])
                     with col1:
-                        st.image(product_details['image'], width=150)
+                        st.image(get_image_url(product_details, 150), width=150)
                     with col2:
                         st.write(f"{i}. {product_details['name']}")
                         st.write(f"${product_details['price']}")
@@ -210,12 +200,12 @@ def display_product_list(products):
             product = st.session_state.product_service.get_product_details(product['product_id'])
             if product:
                 products_history += f"""
-            | <img src="{product["image"]}" width="100" alt="{product["name"]}"> | {i}. **{product["name"]}** | Price: ${product["price"]} |
+            | <img src="{get_image_url(product, 100)}" width="100" alt="{product["name"]}"> | {i}. **{product["name"]}** | Price: ${product["price"]} |
             """
 
                 col1, col2 = st.columns([1, 2])
                 with col1:
-                    st.image(product['image'], width=150)
+                    st.image(get_image_url(product, 150), width=150)
                 with col2:
                     st.write(f"{i}. {product['name']}")
                     st.write(f"${product['price']}")
@@ -239,13 +229,21 @@ def display_compare(text):
                 row_md = []
                 for col in df.columns:
                     if col == 'Image':
-                        row_md.append(f'<img src="{row[col]}" width="100">')
+                        row_md.append(f'<img src="{row[col]}" width="100">' if isinstance(row[col], str) and row[col] else '')
                     else:
                         row_md.append(str(row[col]))
                 markdown += "| " + " | ".join(row_md) + " |\n"
             return markdown
                 
         
+        # Knowledge base documents no longer carry image URLs, so take them from the product service.
+        # Image URLs are cached across reruns. Rows whose product cannot be looked up are shown without an image
+        images = []
+        for _, row in df.iterrows():
+            image = st.session_state.product_service.get_product_image_url(row['Product ID'], 100) or row.get('Image')
+            images.append(image if isinstance(image, str) and image else None)
+        df['Image'] = images
+
         product_list=[]
         # Display dataframe with buttons for each action
         for index, row in df.iterrows():
@@ -453,14 +451,9 @@ def create_shipping_form():
             st.form_submit_button("Submit", on_click=submit_callback, use_container_width=True)
 
 def upload_image():
-    if 'chat_file' in st.session_state:
-        uploaded_file = st.session_state.chat_file
-        file_name = uploaded_file.name
-        file_path = os.path.join(st.session_state.chat_directory, file_name)
-        # Save the file
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-        st.session_state.chat_image = file_path
+    if 'chat_file' in st.session_state and st.session_state.chat_file is not None:
+        # Keep the in-memory upload, it is decoded and resized without touching the disk
+        st.session_state.chat_image = st.session_state.chat_file
 
     
 def load_demo():
@@ -479,10 +472,15 @@ def load_demo():
     st.sidebar.file_uploader("Upload Image to Chat", type=["jpg", "jpeg", "png"], key="chat_file", on_change = upload_image)
 
     encoded_image = None
+    image_media_type = 'image/jpeg'
     if st.session_state.chat_image:
-        encoded_image = encode_image(st.session_state.chat_image)
+        image = encode_image(st.session_state.chat_image, st.session_state.config.IMAGE_QUALITY_PRESET)
+        encoded_image = image['data']
+        image_media_type = image['media_type']
+        st.session_state.total_image_tokens += image['estimated_tokens']
+        st.session_state.logger.info(f"Image resized to {image['width']}x{image['height']}, estimated {image['estimated_tokens']} input tokens")
         # Add image to messages as HTML tag
-        img_html = f'<img src="data:image/jpeg;base64,{encoded_image}" alt="Uploaded Image" style="max-width: 300px; max-height: 300px;"/>'
+        img_html = f'<img src="data:{image_media_type};base64,{encoded_image}" alt="Uploaded Image" style="max-width: 300px; max-height: 300px;"/>'
         st.session_state.messages.append({"role": "user", "content": img_html})
         chat_container.chat_message("user").markdown(img_html, unsafe_allow_html=True)
         st.session_state.chat_image = None
@@ -504,7 +502,7 @@ def load_demo():
             with st.spinner('...'):
                 response = GetAnswers(user_query, st.session_state.session_id, st.session_state.bedrock_agent, 
                                        st.session_state.config.SHOPPING_AGENT_ID, st.session_state.config.SHOPPING_AGENT_ALIAS_ID,
-                                       st.session_state.agent_session_state, encoded_image)
+                                       st.session_state.agent_session_state, encoded_image, image_media_type=image_media_type)
 
                 formatted_response, products, related_products, compare_products = reformat_product_output_list(response["output_text"])
                 st.markdown(formatted_response, unsafe_allow_html=True)
@@ -540,7 +538,7 @@ def load_demo():
                 if product: 
                     col1, col2 = st.columns([1.5, 1])
                     with col1:
-                        st.image(product['image'], width=300)
+                        st.image(get_image_url(product, 300), width=300)
                         st.write(f"<small>{product['description']}</small>", unsafe_allow_html=True)
                     with col2:
                         st.write(f"#### {product['name']}")
@@ -583,7 +581,7 @@ def load_demo():
                     
                     # Add exploration to message history
                     selected_content = f"""
-                    <img src="{product['image']}" width="300" alt="{product['name']}"> 
+                    <img src="{get_image_url(product, 300)}" width="300" alt="{product['name']}"> 
 
                     #### {product['name']}
 
@@ -732,6 +730,7 @@ def load_cost():
     st.markdown (f"Total Agent Invoke Count: **{st.session_state.total_invoke_agent}**")
     st.markdown(f"Price per 1,000 input tokens: **${st.session_state.config.MODEL_INPUT_TOKEN_PRICE}**")
     st.markdown(f"Price per 1,000 output tokens: **${st.session_state.config.MODEL_OUTPUT_TOKEN_PRICE}**")
+    st.markdown(f"Estimated image input tokens ({st.session_state.config.IMAGE_QUALITY_PRESET} preset): **{st.session_state.total_image_tokens}**")
 
     st.markdown("""
         | Token Type      | Total Tokens | Cost [USD] |
@@ -1,8 +1,9 @@
 # auth.py
 import base64
-from utils.config import Config
+import hashlib
+from utils.config import get_config
+from utils.token_refresher import get_token_refresher
 from datetime import datetime, timezone
-import requests
 import urllib.parse
 import streamlit as st
 import jwt
@@ -10,7 +11,7 @@ import jwt
 def initialize_session_vars():
     """Initialize Streamlit session state variables."""
     if 'config' not in st.session_state:
-        st.session_state.config = Config()
+        st.session_state.config = get_config()
     if 'user_authenticated' not in st.session_state:
         st.session_state.user_authenticated = False
     if 'user_profile' not in st.session_state:
@@ -21,6 +22,8 @@ def initialize_session_vars():
         st.session_state.auth_result = None
     if 'auth_code' not in st.session_state:
         st.session_state.auth_code = None
+    if 'verified_claims' not in st.session_state:
+        st.session_state.verified_claims = {}
 
 def reset_session_state():
     """Reset session state variables related to authentication."""
@@ -28,10 +31,20 @@ def reset_session_state():
     st.session_state.user_profile = None
     st.session_state.access_token = None
     st.session_state.auth_code = None
+    st.session_state.verified_claims = {}
 
 
+def get_token_hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
 def decode_jwt(token):
-    """Decode JWT token."""
+    """Decode JWT token. Claims verified earlier in this session are reused until the token expires."""
+    current_timestamp = datetime.now(timezone.utc).timestamp()
+    token_hash = get_token_hash(token)
+    cached_claims = st.session_state.verified_claims.get(token_hash)
+    if cached_claims and cached_claims['exp'] > current_timestamp:
+        return cached_claims
+
     try:
         if st.session_state.config.JWKS_CLIENT:
             signing_key = st.session_state.config.JWKS_CLIENT.get_signing_key_from_jwt(token)
@@ -42,8 +55,16 @@ def decode_jwt(token):
                 audience=st.session_state.config.COGNITO_CLIENT_ID,
                 options={"verify_exp": True}
             )
+            # Drop claims of expired tokens, e.g. the id token replaced by a refresh
+            st.session_state.verified_claims = {
+                key: value for key, value in st.session_state.verified_claims.items()
+                if value['exp'] > current_timestamp
+            }
+            st.session_state.verified_claims[token_hash] = claims
             return claims
         return None
+    except jwt.ExpiredSignatureError:
+        return None
     except jwt.DecodeError:
         print('error')
         return None
@@ -51,6 +72,8 @@ def decode_jwt(token):
 def is_token_expired(token):
     """Check if the token is expired."""
     decoded_token = decode_jwt(token)
+    if decoded_token is None:
+        return True
     exp_timestamp = decoded_token['exp']
     current_timestamp = datetime.now(timezone.utc).timestamp()
     return current_timestamp > exp_timestamp
@@ -67,38 +90,24 @@ def get_info_from_amz_header(amz_header):
 
 def get_tokens(auth_code):
     """Exchange auth code for tokens."""
-    token_url = f"{st.session_state.config.COGNITO_DOMAIN}/oauth2/token"
-    auth = base64.b64encode(f"{st.session_state.config.COGNITO_CLIENT_ID}:{st.session_state.config.COGNITO_CLIENT_SECRET}".encode()).decode()
-    headers = {
-        'Content-Type': 'application/x-www-form-urlencoded',
-        'Authorization': f'Basic {auth}'
-    }
     data = {
         'grant_type': 'authorization_code',
         "client_id": st.session_state.config.COGNITO_CLIENT_ID,
         'code': auth_code,
         'redirect_uri': st.session_state.config.REDIRECT_URI,
     }
-    response = requests.post(token_url, headers=headers, data=data)
+    response = get_token_refresher().post(data)
     if response.status_code == 200:
             return response.json()
     return None
 
-def refresh_token(refresh_token):
-    """Refresh access token using refresh token."""
-    token_url = f"{st.session_state.config.COGNITO_DOMAIN}/oauth2/token"
-    auth = base64.b64encode(f"{st.session_state.config.COGNITO_CLIENT_ID}:{st.session_state.config.COGNITO_CLIENT_SECRET}".encode()).decode()
-    headers = {
-        'Content-Type': 'application/x-www-form-urlencoded',
-        'Authorization': f'Basic {auth}'
-    }
-    data = {
-        'grant_type': 'refresh_token',
-        'refresh_token': refresh_token,
-        'client_id': st.session_state.config.COGNITO_CLIENT_ID,
-    }
-    response = requests.post(token_url, headers=headers, data=data)
-    return response.json()
+def apply_refreshed_tokens(new_tokens):
+    """Store refreshed tokens in the session. Returns False if the refresh did not return tokens."""
+    if not new_tokens or 'id_token' not in new_tokens or 'access_token' not in new_tokens:
+        return False
+    # Cognito does not return a new refresh token, keep the current one
+    st.session_state.auth_result.update(new_tokens)
+    return True
 
 def get_cognito_login_url():
     """Generate Cognito login URL."""
@@ -170,26 +179,28 @@ def authenticate_user():
         access_token = st.session_state.auth_result['access_token']
         refresh_token_value = st.session_state.auth_result['refresh_token']
 
-        # Check if tokens are expired and refresh if necessary
-        if is_token_expired(id_token):
-            new_tokens = refresh_token(refresh_token_value)
-            if 'id_token' in new_tokens and 'access_token' in new_tokens:
-                st.session_state.auth_result.update(new_tokens)
-                id_token = new_tokens['id_token']
-                access_token = new_tokens['access_token']
-                st.session_state.access_token = access_token
-                st.session_state.user_profile = decode_jwt(id_token)
-                st.session_state.user_authenticated = True
-                add_logout()
-            else:
+        token_refresher = get_token_refresher()
+        claims = decode_jwt(id_token)
+
+        if claims is None:
+            # Token already expired, e.g. the session was idle. Wait for the refresh as nothing can be rendered without it
+            if not apply_refreshed_tokens(token_refresher.wait_for_refresh(refresh_token_value)):
                 reset_session_state()
                 return False
         else:
-            st.session_state.user_profile = decode_jwt(id_token)
-            st.session_state.access_token = access_token
-            st.session_state.user_authenticated = True
-            add_logout()
-            return True
+            # Renew tokens in the background shortly before they expire and pick them up on a later rerun
+            current_timestamp = datetime.now(timezone.utc).timestamp()
+            if claims['exp'] - current_timestamp < st.session_state.config.TOKEN_REFRESH_AHEAD_SECONDS:
+                token_refresher.schedule_refresh(refresh_token_value)
+            apply_refreshed_tokens(token_refresher.pop_completed(refresh_token_value))
+
+        id_token = st.session_state.auth_result['id_token']
+        access_token = st.session_state.auth_result['access_token']
+        st.session_state.user_profile = decode_jwt(id_token)
+        st.session_state.access_token = access_token
+        st.session_state.user_authenticated = True
+        add_logout()
+        return True
     
     """Login user based on ALB authentication headers for Cognito Hosted UI on AWS."""
     headers = st.context.headers
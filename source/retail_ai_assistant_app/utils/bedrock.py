@@ -1,5 +1,6 @@
 # utils/bedrock.py
 import json
+import streamlit as st
 from botocore.exceptions import ClientError
 
 class BedrockAgent:
@@ -15,7 +16,7 @@ class BedrockAgent:
         print(self.bedrock_runtime._endpoint)
         
     
-    def invoke_claude_model(self, prompt, base64_image= None, model_id='anthropic.claude-3-haiku-20240307-v1:0', generation_config = None):
+    def invoke_claude_model(self, prompt, base64_image= None, model_id='anthropic.claude-3-haiku-20240307-v1:0', generation_config = None, image_media_type='image/jpeg'):
         if prompt is None or prompt == '' or "claude" not in model_id:
             return
 
@@ -38,7 +39,7 @@ class BedrockAgent:
                 user_message = {"role": "user",
                 "content": [
                     {"type": "image", "source": {"type": "base64",
-                        "media_type": "image/jpeg", "data": base64_image}},
+                        "media_type": image_media_type, "data": base64_image}},
                     {"type": "text", "text": prompt}
                     ]}
             else:
@@ -54,6 +55,8 @@ class BedrockAgent:
             response = self.bedrock_runtime.invoke_model(body=body, modelId=model_id, accept=accept, contentType=contentType)
             response_body = json.loads(response.get('body').read())
             outputText = response_body["content"][0]["text"]
+            usage = response_body.get("usage", {})
+            self.logger.info("Model %s used %s input tokens and %s output tokens", model_id, usage.get("input_tokens"), usage.get("output_tokens"))
 
         except Exception as err:
             message = err.response["Error"]["Message"]
@@ -63,10 +66,10 @@ class BedrockAgent:
         
         return outputText
 
-    def invoke_agent(self, agent_id, agent_alias_id, session_id, session_state, prompt, base64_image = None, end_session:bool = False):
+    def invoke_agent(self, agent_id, agent_alias_id, session_id, session_state, prompt, base64_image = None, end_session:bool = False, image_media_type='image/jpeg'):
         try:
             if base64_image:
-                output_text = self.invoke_claude_model("Return only list of products in the image", base64_image)
+                output_text = self.invoke_claude_model("Return only list of products in the image", base64_image, image_media_type=image_media_type)
                 if output_text:
                     prompt = prompt + "\n" + output_text
             
@@ -116,3 +119,7 @@ class BedrockAgent:
         }
 
 
+@st.cache_resource
+def get_bedrock_agent(_session, _logger):
+    """Share one set of thread-safe boto3 clients across all Streamlit sessions."""
+    return BedrockAgent(_session, _logger)
@@ -1,7 +1,7 @@
 # config.py
 import os
 import boto3
-import requests
+import streamlit as st
 from jwt import PyJWKClient
 from dotenv import load_dotenv
 
@@ -23,33 +23,21 @@ class Config:
         self.AWS_ACCOUNT_ID, self.AWS_REGION, self.SESSION = self.get_aws_env_values()
         self.MODEL_INPUT_TOKEN_PRICE = 0.003 # Price per 1000 tokens
         self.MODEL_OUTPUT_TOKEN_PRICE = 0.015 # Price per 1000 tokens
+        self.JWKS_CACHE_TTL = int(os.environ.get("JWKS_CACHE_TTL", "3600")) # Seconds to reuse the Cognito JWKS before fetching it again
+        self.TOKEN_REFRESH_AHEAD_SECONDS = int(os.environ.get("TOKEN_REFRESH_AHEAD_SECONDS", "300")) # Refresh Cognito tokens in the background this long before they expire
+        self.IMAGE_QUALITY_PRESET = os.environ.get("IMAGE_QUALITY_PRESET", "balanced") # fast, balanced or detailed image token budget
         self.JWKS_CLIENT = self.get_jwks_client()
 
     
     def get_aws_env_values(self):
-        key = os.environ.get('AWS_ACCESS_KEY_ID', '')
-        secret = os.environ.get('AWS_SECRET_ACCESS_KEY','')
-        sessionToken = None
-
-        credentials_relative_uri = os.environ.get('AWS_CONTAINER_CREDENTIALS_RELATIVE_URI','')
-        sessionToken = None
-        # This is internal container URL, not exposed anywhere
-        credentials_url = f'http://169.254.170.2{credentials_relative_uri}'
-        if credentials_relative_uri != '':
-            response = requests.get(credentials_url)
-            response_json = response.json()
-            key = response_json['AccessKeyId']
-            secret = response_json['SecretAccessKey']
-            sessionToken = response_json['Token']
-
         AWS_ACCOUNT_ID =  os.environ.get("ACCOUNT_ID")
         AWS_REGION = os.environ.get('AWS_REGION',os.environ.get('AWS_DEFAULT_REGION'))
-        
-        if key == '' or secret == '':
-            session_kwargs = {"region_name": AWS_REGION,  "aws_session_token": sessionToken}
-        else:
-            session_kwargs = {"region_name": AWS_REGION, "aws_access_key_id" : key, "aws_secret_access_key" : secret, "aws_session_token": sessionToken}
-        
+
+        # Credentials are resolved by the botocore provider chain: environment variables, profile,
+        # then the ECS container provider (AWS_CONTAINER_CREDENTIALS_RELATIVE_URI), which refreshes
+        # the task role credentials before they expire.
+        session_kwargs = {"region_name": AWS_REGION}
+
         profile_name = os.environ.get("AWS_PROFILE")
         if profile_name:
             print(f"Using profile: {profile_name}")
@@ -62,7 +50,13 @@ class Config:
     def get_jwks_client(self):
         if self.COGNITO_POOL_ID:
             keys_url = 'https://cognito-idp.{}.amazonaws.com/{}/.well-known/jwks.json'.format(self.AWS_REGION, self.COGNITO_POOL_ID)
-            jwks_client = PyJWKClient(keys_url)
+            # Signing keys are cached for the process. An unknown key id (key rotation) forces a JWKS refetch.
+            jwks_client = PyJWKClient(keys_url, cache_keys=True, cache_jwk_set=True, lifespan=self.JWKS_CACHE_TTL)
             return jwks_client
         else:
             return None
+
+@st.cache_resource
+def get_config():
+    """Process-wide Config shared by all Streamlit sessions, created on first use."""
+    return Config()
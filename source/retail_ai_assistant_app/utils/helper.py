@@ -1,37 +1,29 @@
-import base64
-import os
-from PIL import Image
+import hashlib
+import streamlit as st
+from utils.image_processing import DEFAULT_IMAGE_QUALITY_PRESET, preprocess_image
 
-def encode_image(file_path):
+def get_image_url(product, width):
+    """Smallest image variant of a product at least width pixels wide, or the original image without variants."""
+    for variant in product.get('image_variants', []):
+        if variant['width'] >= width:
+            return variant['url']
+    return product['image']
 
-    # The maximum image size allowed is 5MB
-    current_size = os.path.getsize(file_path) / (1024 * 1024) 
-    if current_size > 5:
-        resize_image(file_path, 300, 300)
+def encode_image(image_source, preset_name=DEFAULT_IMAGE_QUALITY_PRESET):
+    """Return the preprocessed, base64 encoded image for an uploaded file or a local file path."""
+    if hasattr(image_source, 'getbuffer'):
+        # Streamlit UploadedFile is an in-memory BytesIO, hash its buffer without copying it
+        digest = hashlib.sha256(image_source.getbuffer()).hexdigest()
+    else:
+        with open(image_source, 'rb') as image_file:
+            digest = hashlib.sha256(image_file.read()).hexdigest()
 
-    with open(file_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+    return process_image(digest, image_source, preset_name)
 
-def resize_image(file_path, max_width=300, max_height=300):
-    
-    # Open the image
-    with Image.open(file_path) as img:
-        # Get original dimensions
-        original_width, original_height = img.size
-        
-        # Calculate the aspect ratio
-        aspect_ratio = original_width / original_height
-        
-        # Determine new dimensions
-        if original_width > original_height:
-            new_width = min(max_width, original_width)
-            new_height = int(new_width / aspect_ratio)
-        else:
-            new_height = min(max_height, original_height)
-            new_width = int(new_height * aspect_ratio)
-        
-        # Resize the image
-        img_resized = img.resize((new_width, new_height), Image.LANCZOS)
-        
-        # Save the resized image back to the same file path
-        img_resized.save(file_path, optimize=True, quality=85)
\ No newline at end of file
+@st.cache_data(max_entries=32, show_spinner=False)
+def process_image(digest, _image_source, preset_name=DEFAULT_IMAGE_QUALITY_PRESET):
+    """Decode, downscale and re-encode an image once per content hash and preset."""
+    if hasattr(_image_source, 'seek'):
+        _image_source.seek(0)
+
+    return preprocess_image(_image_source, preset_name)
@@ -0,0 +1,70 @@
+# utils/image_processing.py
+import base64
+import io
+import math
+from PIL import Image
+
+# Claude vision models bill roughly (width * height) / 750 input tokens per image
+# and downscale anything larger than 1568px on the long edge before inference.
+# See https://docs.anthropic.com/en/docs/build-with-claude/vision
+PIXELS_PER_TOKEN = 750
+MAX_IMAGE_DIMENSION = 1568
+
+# Token budget per image for each quality preset
+IMAGE_QUALITY_PRESETS = {
+    "fast": {"max_tokens": 400, "jpeg_quality": 75},
+    "balanced": {"max_tokens": 800, "jpeg_quality": 85},
+    "detailed": {"max_tokens": 1600, "jpeg_quality": 90},
+}
+DEFAULT_IMAGE_QUALITY_PRESET = "balanced"
+
+def get_preset(preset_name):
+    if preset_name not in IMAGE_QUALITY_PRESETS:
+        raise ValueError(f"Unknown image quality preset '{preset_name}'. Valid presets: {', '.join(IMAGE_QUALITY_PRESETS)}")
+    return IMAGE_QUALITY_PRESETS[preset_name]
+
+def estimate_image_tokens(width, height):
+    """Estimate the input tokens the model charges for an image of the given size."""
+    return math.ceil((width * height) / PIXELS_PER_TOKEN)
+
+def get_target_dimensions(width, height, preset_name=DEFAULT_IMAGE_QUALITY_PRESET):
+    """Largest size that keeps the aspect ratio and fits the preset's token budget. Never upscales."""
+    max_tokens = get_preset(preset_name)["max_tokens"]
+    max_pixels = max_tokens * PIXELS_PER_TOKEN
+
+    scale = min(
+        1.0,
+        MAX_IMAGE_DIMENSION / max(width, height),
+        math.sqrt(max_pixels / (width * height))
+    )
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+def preprocess_image(image_source, preset_name=DEFAULT_IMAGE_QUALITY_PRESET):
+    """Decode an image file or file-like object, resize it for the preset and return it base64 encoded."""
+    preset = get_preset(preset_name)
+
+    with Image.open(image_source) as img:
+        target_width, target_height = get_target_dimensions(img.width, img.height, preset_name)
+
+        # Let the JPEG decoder skip DCT blocks we would throw away when downscaling
+        img.draft('RGB', (target_width, target_height))
+        img.thumbnail((target_width, target_height), Image.LANCZOS)
+
+        output = io.BytesIO()
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            # Keep transparency, JPEG would render transparent areas black
+            img.save(output, format='PNG', optimize=True)
+            media_type = 'image/png'
+        else:
+            img.convert('RGB').save(output, format='JPEG', optimize=True, quality=preset["jpeg_quality"])
+            media_type = 'image/jpeg'
+
+        width, height = img.size
+
+    return {
+        "data": base64.b64encode(output.getbuffer()).decode('utf-8'),
+        "media_type": media_type,
+        "width": width,
+        "height": height,
+        "estimated_tokens": estimate_image_tokens(width, height)
+    }
@@ -4,10 +4,23 @@ import json
 import requests
 from dotenv import load_dotenv
 import streamlit as st
+from utils.helper import get_image_url
 
 # Load environment variables from a .env file
 load_dotenv()
 
+@st.cache_data(ttl=300, max_entries=1000, show_spinner=False)
+def fetch_product_image_url(api_url, _api_key, product_id, width):
+    """Image URL of a product, shared by all sessions. Only the URL is cached, so stock and prices are always read live.
+    Request errors are raised, so they are not cached."""
+    headers = {
+        'Content-Type': 'application/json',
+        'x-api-key': _api_key
+    }
+    response = requests.get(f"{api_url}/products/id/{product_id}", headers=headers, timeout=10)
+    response.raise_for_status()
+    return get_image_url(response.json(), width)
+
 class ProductService:
     def __init__(self, _api_url, _api_key, _logger):
         self.api_url = _api_url
@@ -28,3 +41,10 @@ class ProductService:
             self.logger.error(f"Error fetching product details: {e}")
             return None
 
+    def get_product_image_url(self, product_id, width):
+        try:
+            return fetch_product_image_url(self.api_url, self.api_key, product_id, width)
+        except requests.exceptions.RequestException as e:
+            self.logger.error(f"Error fetching product image: {e}")
+            return None
+
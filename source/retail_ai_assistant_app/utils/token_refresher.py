@@ -0,0 +1,137 @@
+# utils/token_refresher.py
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from utils.config import get_config
+
+logger = logging.getLogger('retail-ai-agent')
+
+class TokenRefresher:
+    """Refreshes Cognito tokens on a background thread pool over a pooled HTTP session.
+
+    Refreshes are keyed by a hash of the refresh token, so concurrent reruns of the same
+    Streamlit session share a single in-flight request. Finished refreshes that no session
+    picks up, e.g. because the browser tab was closed, are dropped after finished_ttl seconds.
+    """
+
+    def __init__(self, cognito_domain, client_id, client_secret, max_workers=4, timeout=10, finished_ttl=300):
+        self.token_url = f"{cognito_domain}/oauth2/token"
+        self.client_id = client_id
+        self.timeout = timeout
+        self.finished_ttl = finished_ttl
+        auth = base64.b64encode(f"{client_id}:{client_secret}".encode()).decode()
+        self.headers = {
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Authorization': f'Basic {auth}'
+        }
+
+        # Keep-alive connections to the Cognito domain are reused across refreshes
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=2)
+        self.http.mount('https://', adapter)
+        self.http.mount('http://', adapter)
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='token-refresh')
+        self.lock = threading.Lock()
+        # Refresh token hash: (future, time the refresh was scheduled)
+        self.refreshes = {}
+        self.latencies_ms = deque(maxlen=100)
+        self.refresh_count = 0
+        self.failure_count = 0
+
+    def post(self, data):
+        """POST a grant to the Cognito token endpoint and return the response."""
+        return self.http.post(self.token_url, headers=self.headers, data=data, timeout=self.timeout)
+
+    def refresh(self, refresh_token):
+        """Synchronously exchange a refresh token for new tokens. Returns None on failure."""
+        data = {
+            'grant_type': 'refresh_token',
+            'refresh_token': refresh_token,
+            'client_id': self.client_id,
+        }
+        start = time.perf_counter()
+        try:
+            response = self.post(data)
+            tokens = response.json() if response.status_code == 200 else None
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error refreshing Cognito tokens: {e}")
+            tokens = None
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        with self.lock:
+            self.refresh_count += 1
+            self.latencies_ms.append(latency_ms)
+            if tokens is None:
+                self.failure_count += 1
+        logger.info(f"Cognito token refresh {'succeeded' if tokens else 'failed'} in {latency_ms:.0f} ms")
+        # Process-wide counters for operators, published to the app log rather than shown to shoppers
+        logger.info(f"Cognito token refresh metrics: {json.dumps(self.get_metrics())}")
+        return tokens
+
+    def evict_finished(self):
+        """Drop finished refreshes older than finished_ttl, with the tokens they hold. Called with the lock held."""
+        cutoff = time.monotonic() - self.finished_ttl
+        for key, (future, scheduled_at) in list(self.refreshes.items()):
+            if future.done() and scheduled_at < cutoff:
+                del self.refreshes[key]
+
+    def schedule_refresh(self, refresh_token):
+        """Start a background refresh unless one is already running or waiting to be picked up."""
+        key = hashlib.sha256(refresh_token.encode()).hexdigest()
+        with self.lock:
+            self.evict_finished()
+            if key not in self.refreshes:
+                self.refreshes[key] = (self.executor.submit(self.refresh, refresh_token), time.monotonic())
+            return self.refreshes[key][0]
+
+    def pop_completed(self, refresh_token):
+        """Return the new tokens of a finished background refresh, or None if none has finished."""
+        key = hashlib.sha256(refresh_token.encode()).hexdigest()
+        with self.lock:
+            future, _ = self.refreshes.get(key, (None, None))
+            if future is None or not future.done():
+                return None
+            del self.refreshes[key]
+        return future.result()
+
+    def wait_for_refresh(self, refresh_token):
+        """Block until the tokens are refreshed. Only used when the current token has already expired."""
+        try:
+            self.schedule_refresh(refresh_token).result(timeout=self.timeout * 3)
+        except TimeoutError:
+            logger.error("Timed out waiting for Cognito token refresh")
+            return None
+        return self.pop_completed(refresh_token)
+
+    def get_metrics(self):
+        with self.lock:
+            self.evict_finished()
+            latencies = sorted(self.latencies_ms)
+            last_latency_ms = self.latencies_ms[-1] if self.latencies_ms else None
+            in_flight = sum(1 for future, _ in self.refreshes.values() if not future.done())
+            refresh_count = self.refresh_count
+            failure_count = self.failure_count
+
+        return {
+            "refresh_count": refresh_count,
+            "failure_count": failure_count,
+            "in_flight": in_flight,
+            "last_latency_ms": round(last_latency_ms, 1) if last_latency_ms is not None else None,
+            "avg_latency_ms": round(sum(latencies) / len(latencies), 1) if latencies else None,
+            "p95_latency_ms": round(latencies[int(0.95 * (len(latencies) - 1))], 1) if latencies else None
+        }
+
+@st.cache_resource
+def get_token_refresher():
+    """Process-wide TokenRefresher for the configured Cognito app client."""
+    config = get_config()
+    return TokenRefresher(config.COGNITO_DOMAIN, config.COGNITO_CLIENT_ID, config.COGNITO_CLIENT_SECRET)